@@ -0,0 +1,193 @@
+"""
+Runs Scheduler coroutines on an asyncio event loop.
+
+Drop-in for Scheduler.Scheduler: the same generator tasks (yield ReadWait,
+yield CoSocket.accept(), nested generator calls...) run unchanged, stepped
+by Scheduler.Task so call-stack semantics are identical. ReadWait/WriteWait
+become loop.add_reader/add_writer, Sleep/WakeAt and wait timeouts become
+loop.call_later, RunInExecutor uses loop.run_in_executor. asyncio code and
+generator tasks then share one loop; AwaitFuture lets a generator task wait
+on an asyncio future or coroutine, and spawn() gives asyncio code a future
+for a generator task.
+
+Python 3 only (asyncio); written without async syntax.
+Last touched: 10/18/2026
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import time
+from Scheduler import Task, SystemCall, WaitTimeout
+
+class AsyncioScheduler(object):
+	"""Scheduler interface on top of an asyncio event loop."""
+
+	#________________________________________________
+	def __init__(self, loop=None, workers=4):
+		self.loop = loop if loop is not None else asyncio.new_event_loop()
+		self.stats = None
+		self.workers = workers
+		self.executor = None
+		self.read_waiting = {}		# fd -> deque of tasks, first is served first
+		self.write_waiting = {}
+		self.numtasks = 0
+		self.finished = None		# future: all tasks ended, or one raised
+		self.results = {}			# task -> asyncio future from spawn()
+
+	#________________________________________________
+	def new(self, target):
+		task = Task(target)
+		self.numtasks += 1
+		self.schedule(task)
+		return task
+
+	#________________________________________________
+	def spawn(self, target):
+		"""Start generator task; returns asyncio future done when it ends"""
+		future = self.loop.create_future()
+		self.results[self.new(target)] = future
+		return future
+
+	#________________________________________________
+	def schedule(self, task):
+		self.loop.call_soon(self.step, task)
+
+	#________________________________________________
+	def step(self, task):
+		"""Run task up to its next system call, as Scheduler.mainloop does"""
+		try:
+			result = task.run()
+			if isinstance(result, SystemCall):
+				result.handle(self, task)
+			else:
+				self.schedule(task)
+		except StopIteration:
+			self.taskdone(task, None)
+		except Exception as e:
+			self.taskdone(task, e)
+
+	#________________________________________________
+	def taskdone(self, task, exception):
+		self.numtasks -= 1
+		future = self.results.pop(task, None)
+		if future is not None:
+			# Caller of spawn() handles outcome
+			if exception is None:
+				future.set_result(None)
+			else:
+				future.set_exception(exception)
+		elif exception is not None:
+			if self.finished is not None and not self.finished.done():
+				self.finished.set_exception(exception)
+			else:
+				raise exception
+		if self.numtasks == 0 and self.finished is not None and not self.finished.done():
+			self.finished.set_result(None)
+
+	#________________________________________________
+	def readwait(self, task, fd, timeout=None):
+		self.fdwait(self.read_waiting, self.loop.add_reader, task, fd, timeout)
+
+	#________________________________________________
+	def writewait(self, task, fd, timeout=None):
+		self.fdwait(self.write_waiting, self.loop.add_writer, task, fd, timeout)
+
+	#________________________________________________
+	def fdwait(self, waiting, addWatcher, task, fd, timeout):
+		queue = waiting.get(fd)
+		if queue is None:
+			queue = waiting[fd] = collections.deque()
+			addWatcher(fd, self.fdready, waiting, fd)
+		queue.append(task)
+		task.waiting = (waiting, fd)
+		if timeout is not None:
+			self.settimer(task, time.time() + timeout, WaitTimeout("timed out after %g s" % timeout))
+
+	#________________________________________________
+	def fdready(self, waiting, fd):
+		queue = waiting[fd]
+		task = queue.popleft()
+		if not queue:
+			self.fdunwatch(waiting, fd)
+		task.waiting = None
+		task.waitid += 1
+		self.schedule(task)
+
+	#________________________________________________
+	def fdcancel(self, task):
+		waiting, fd = task.waiting
+		queue = waiting[fd]
+		queue.remove(task)
+		if not queue:
+			self.fdunwatch(waiting, fd)
+		task.waiting = None
+
+	#________________________________________________
+	def fdunwatch(self, waiting, fd):
+		del waiting[fd]
+		if waiting is self.read_waiting:
+			self.loop.remove_reader(fd)
+		else:
+			self.loop.remove_writer(fd)
+
+	#________________________________________________
+	def settimer(self, task, deadline, exception=None):
+		"""Wake task at epoch deadline unless woken by something else first"""
+		self.loop.call_later(max(0.0, deadline - time.time()), self.expire, task, task.waitid, exception)
+
+	#________________________________________________
+	def sleepuntil(self, task, deadline):
+		self.settimer(task, deadline)
+
+	#________________________________________________
+	def expire(self, task, waitid, exception):
+		if waitid != task.waitid:
+			return
+		task.waitid += 1
+		if task.waiting is not None:
+			self.fdcancel(task)
+		task.throwval = exception
+		self.schedule(task)
+
+	#________________________________________________
+	def runinexecutor(self, task, fn, args):
+		if self.executor is None:
+			self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+		self.resumewith(task, self.loop.run_in_executor(self.executor, fn, *args))
+
+	#________________________________________________
+	def resumewith(self, task, future):
+		"""Resume task with future's result, or raise its exception in task"""
+		def done(future):
+			if future.cancelled():
+				task.throwval = asyncio.CancelledError()
+			elif future.exception() is not None:
+				task.throwval = future.exception()
+			else:
+				task.sendval = future.result()
+			self.schedule(task)
+		future.add_done_callback(done)
+
+	#________________________________________________
+	def mainloop(self, count=-1, timeout=None):
+		"""Run loop until every task has ended (count and timeout, which poll
+		Scheduler's loop, have no meaning here)
+		"""
+		if self.numtasks:
+			self.finished = self.loop.create_future()
+			try:
+				self.loop.run_until_complete(self.finished)
+			finally:
+				self.finished = None
+
+class AwaitFuture(SystemCall):
+	"""Wait for asyncio future, task or coroutine; result is sent into task."""
+
+	#________________________________________________
+	def __init__(self, awaitable):
+		self.awaitable = awaitable
+
+	#________________________________________________
+	def handle(self, sched, task):
+		sched.resumewith(task, asyncio.ensure_future(self.awaitable, loop=sched.loop))
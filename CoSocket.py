@@ -2,30 +2,194 @@
 Socket wrapper for coroutines.
 
 Python Essential Reference, page 465.
-Last touched: 08/18/2017
+Sends go through a zero-copy cursor (sendmsg for several buffers where the
+platform has it); received data is kept in one reusable buffer that backs
+readline/readexactly/readframe.
+Last touched: 10/18/2026
 """
 
+import errno
+import struct
+from socket import error
+from Scheduler import ReadWait, WriteWait, WaitTimeout
+
+FRAME_HEADER	= struct.Struct("!I")	# readframe: 4-byte big-endian payload length
+MAX_FRAME		= 1 << 20				# largest frame or line accepted, bytes
+RECV_SIZE		= 4096					# initial read buffer size, bytes
+SENDMSG_MAX		= 64					# buffers passed to one sendmsg call
+COALESCE_MAX	= 65536				# without sendmsg, buffers totalling this much are joined into one send
+
+#________________________________________________
+def bufferView(data):
+	"""Return byte view of data whose slices do not copy"""
+	try:
+		view = memoryview(data)
+	except TypeError:
+		return buffer(data)		# Python 2 array: old buffer interface only
+	if view.itemsize != 1:
+		view = view.cast('B')	# Python 3 multi-byte array
+	return view
+
+#________________________________________________
+def bufferTail(view, offset):
+	"""Return view of bytes from offset on, without copying"""
+	if isinstance(view, memoryview):
+		return view[offset:]
+	return buffer(view, offset)
+
 class CoSocket(object):
 	def __init__(self,sock):
 		self.sock = sock
+		self.rbuf = bytearray(RECV_SIZE)	# received, unconsumed data is rbuf[rstart:rend]
+		self.rstart = 0
+		self.rend = 0
+		self.scanned = 0					# rbuf[rstart:scanned] known to hold no newline
+		self.drained = True					# last fill took everything socket had queued
 	def close(self):
 		yield self.sock.close()
 	def bind(self,addr):
 		yield self.sock.bind(addr)
 	def listen(self,backlog):
 		yield self.sock.listen(backlog)
-	def connect(self,addr):
-		yield WriteWait(self.sock)
+	def connect(self,addr,timeout=None):
+		yield WriteWait(self.sock,timeout)
 		yield self.sock.connect(addr)
-	def accept(self):
-		yield ReadWait(self.sock)
+	def accept(self,timeout=None):
+		yield ReadWait(self.sock,timeout)
 		conn, addr = self.sock.accept()
+		conn.setblocking(0)		# partial sends; never stall scheduler
 		yield CoSocket(conn), addr
-	def send(self,data):
-		while data:
-			evt = yield WriteWait(self.sock)
-			nsent = self.sock.send(data)
-			data = data[nsent:]
-	def recv(self,maxsize):
-		yield ReadWait(self.sock)
+
+	# Send all of data (str, bytes, bytearray, array...) through a moving view
+	def send(self,data,timeout=None):
+		view = bufferView(data)
+		offset = 0
+		while offset < len(view):
+			yield WriteWait(self.sock,timeout)
+			try:
+				offset += self.sock.send(bufferTail(view, offset))
+			except error as e:
+				if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+					raise
+
+	# Send list of buffers in order; scatter/gather with sendmsg if available
+	def sendall(self,buffers,timeout=None):
+		if not hasattr(self.sock, 'sendmsg'):
+			# Join small replies: separate small sends stall on Nagle/delayed ACK
+			views = [bufferView(data) for data in buffers]
+			if sum([len(view) for view in views]) <= COALESCE_MAX:
+				views = [b"".join([view.tobytes() if isinstance(view, memoryview) else bytes(view)
+					for view in views])]
+			for view in views:
+				yield self.send(view,timeout)
+			return
+		views = [bufferView(data) for data in buffers]
+		views = [view for view in views if len(view)]
+		while views:
+			yield WriteWait(self.sock,timeout)
+			try:
+				nsent = self.sock.sendmsg(views[:SENDMSG_MAX])
+			except error as e:
+				if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+					raise
+				continue
+			# Drop buffers fully sent, then trim partly sent one
+			done = 0
+			while done < len(views) and nsent >= len(views[done]):
+				nsent -= len(views[done])
+				done += 1
+			del views[:done]
+			if nsent:
+				views[0] = views[0][nsent:]
+
+	# Return buffered data if any, else wait for and return one chunk
+	def recv(self,maxsize,timeout=None):
+		if self.rend > self.rstart:
+			end = min(self.rend, self.rstart + maxsize)
+			data = bytes(self.rbuf[self.rstart:end])
+			self.consume(end)
+			yield data
+			return
+		yield ReadWait(self.sock,timeout)
 		yield self.sock.recv(maxsize)
+
+	# Mark rbuf up to end as used
+	def consume(self,end):
+		self.rstart = end
+		self.scanned = max(self.scanned, end)
+		if self.rstart == self.rend:
+			self.rstart = self.rend = self.scanned = 0
+
+	# Read more into rbuf, moving unconsumed data to front or growing only when
+	#  full; returns number of bytes read, 0 at end of file
+	def fill(self,timeout=None):
+		if self.rend == len(self.rbuf):
+			unconsumed = self.rend - self.rstart
+			if self.rstart:
+				self.rbuf[:unconsumed] = self.rbuf[self.rstart:self.rend]
+				self.scanned -= self.rstart
+				self.rstart = 0
+				self.rend = unconsumed
+			else:
+				self.rbuf.extend(bytearray(len(self.rbuf)))
+		while True:
+			yield ReadWait(self.sock,timeout)
+			try:
+				n = self.sock.recv_into(memoryview(self.rbuf)[self.rend:])
+				break
+			except error as e:
+				if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+					raise
+		self.rend += n
+		self.drained = self.rend < len(self.rbuf)		# recv stopped short of space given
+		yield n
+
+	# Return next line including its newline; at end of file returns whatever
+	#  is left (empty if nothing). Lines longer than maxsize raise ValueError.
+	#  With linger, an unterminated line is returned once no more data has
+	#  arrived for linger seconds (for peers that do not send newlines), or at
+	#  once if nothing more is queued and complete(line) is true.
+	def readline(self,timeout=None,maxsize=MAX_FRAME,linger=None,complete=None):
+		while True:
+			i = self.rbuf.find(b"\n", self.scanned, self.rend)
+			if i >= 0:
+				line = bytes(self.rbuf[self.rstart:i+1])
+				self.consume(i+1)
+				yield line
+				return
+			self.scanned = self.rend
+			if self.rend - self.rstart >= maxsize:
+				raise ValueError("line longer than %d bytes" % maxsize)
+			if linger is not None and self.rend > self.rstart:
+				if complete is not None and self.drained and complete(bytes(self.rbuf[self.rstart:self.rend])):
+					n = 0
+				else:
+					try:
+						n = yield self.fill(linger)
+					except WaitTimeout:
+						n = 0
+			else:
+				n = yield self.fill(timeout)
+			if not n:
+				line = bytes(self.rbuf[self.rstart:self.rend])
+				self.consume(self.rend)
+				yield line
+				return
+
+	# Return exactly n bytes; EOFError if connection closes first
+	def readexactly(self,n,timeout=None):
+		while self.rend - self.rstart < n:
+			if not (yield self.fill(timeout)):
+				raise EOFError("connection closed after %d of %d bytes" % (self.rend - self.rstart, n))
+		data = bytes(self.rbuf[self.rstart:self.rstart+n])
+		self.consume(self.rstart + n)
+		yield data
+
+	# Return payload of one length-prefixed frame (see FRAME_HEADER)
+	def readframe(self,timeout=None,maxsize=MAX_FRAME):
+		header = yield self.readexactly(FRAME_HEADER.size,timeout)
+		length = FRAME_HEADER.unpack(header)[0]
+		if length > maxsize:
+			raise ValueError("frame of %d bytes exceeds %d" % (length, maxsize))
+		payload = yield self.readexactly(length,timeout)
+		yield payload
@@ -0,0 +1,169 @@
+"""
+DS18B20 resolution control and per-sensor sample scheduling on a DS2482 bus.
+
+Each sensor gets its own sample period and resolution (9-12 bits); sensors
+coming due together share one conversion wait. Resolution is copied to the
+sensor's EEPROM so it survives a power cycle, and every reading is checked
+against it: a sensor found at another resolution may not have finished
+converting (a reset sensor reads its 85 deg C power-on value), so that reading
+is dropped and the resolution written again.
+Last touched: 10/18/2026
+"""
+
+import time
+import DS2482
+
+# --- Constants ---
+# DS18B20 function commands
+DS18B20_WRITE_SCRATCHPAD	= 0x4E
+DS18B20_READ_SCRATCHPAD		= 0xBE
+DS18B20_COPY_SCRATCHPAD		= 0x48
+
+# Configuration register values and maximum conversion times (seconds) by resolution
+RESOLUTION_CONFIG	= {9: 0x1F, 10: 0x3F, 11: 0x5F, 12: 0x7F}
+CONVERSION_TIME		= {9: 0.094, 10: 0.188, 11: 0.375, 12: 0.750}
+EEPROM_WRITE_TIME	= 0.010		# seconds for Copy Scratchpad to complete
+
+# Defined bits of raw temperature (scratchpad bytes 0-1), indexed by
+#  configuration register bits R1R0 (bits 6-5); lower bits are undefined below 12 bits
+RAW_MASK			= [0xFFF8, 0xFFFC, 0xFFFE, 0xFFFF]
+
+#________________________________________________
+def rawTemperature(scratchPad):
+	"""Return signed 1/16 deg C reading from scratchpad, undefined low bits cleared
+	for the resolution in its configuration byte
+	"""
+	raw = (scratchPad[0] | (scratchPad[1] << 8)) & RAW_MASK[(scratchPad[4] >> 5) & 3]
+	if raw & 0x8000:
+		raw -= 0x10000
+	return raw
+
+GROUP_WINDOW		= 0.5		# sensors due within this many seconds are sampled together
+
+#________________________________________________
+def readScratchpad(controller, rom):
+	"""Return 9 scratchpad bytes from sensor with given ROM code, or None if no presence"""
+	return controller.DS2482_owTransaction([DS2482.OW_MATCH_ROM] + rom + [DS18B20_READ_SCRATCHPAD], 9)
+
+#________________________________________________
+def setResolution(controller, rom, bits):
+	"""Write sensor configuration register for 9-12 bit resolution, keeping TH/TL alarm bytes,
+	and copy it to EEPROM so sensor powers up at it. Returns True if successful.
+	"""
+	scratchPad = readScratchpad(controller, rom)
+	if scratchPad is None or DS2482.owCrc8(scratchPad) != 0:
+		print("*** Unable to read scratchpad to set resolution")
+		return False
+
+	if scratchPad[4] == RESOLUTION_CONFIG[bits]:
+		return True					# already set; skip write
+
+	result = controller.DS2482_owTransaction([DS2482.OW_MATCH_ROM] + rom +
+		[DS18B20_WRITE_SCRATCHPAD, scratchPad[2], scratchPad[3], RESOLUTION_CONFIG[bits]])
+	if result is None:
+		return False
+	result = controller.DS2482_owTransaction([DS2482.OW_MATCH_ROM] + rom + [DS18B20_COPY_SCRATCHPAD])
+	time.sleep(EEPROM_WRITE_TIME)
+	return result is not None
+
+class SampleSchedule(object):
+	"""Samples each sensor at its own period and resolution.
+
+	rates is a list of (period seconds, resolution bits) in sensor index order;
+	sensors beyond the list use defaultRate.
+	"""
+
+	#________________________________________________
+	def __init__(self, rates, defaultRate=(10, 12)):
+		self.rates = list(rates)
+		self.defaultRate = defaultRate
+		self.nextDue = []
+		self.configured = 0
+
+	#________________________________________________
+	def configure(self, controller, romCodes):
+		"""Write resolution of any sensors not yet configured; all sensors due at once"""
+		now = time.time()
+		while len(self.rates) < len(romCodes):
+			self.rates.append(self.defaultRate)
+		while len(self.nextDue) < len(romCodes):
+			self.nextDue.append(now)
+
+		for sensor in range(self.configured, len(romCodes)):
+			period, bits = self.rates[sensor]
+			if not setResolution(controller, romCodes[sensor], bits):
+				print("*** Resolution not set for sensor %d" % (sensor))
+		self.configured = len(romCodes)
+
+	#________________________________________________
+	def nextDueTime(self):
+		"""Return time when next sensor is due"""
+		return min(self.nextDue)
+
+	#________________________________________________
+	def service(self, controller, romCodes):
+		"""Convert and read all sensors due now (or within GROUP_WINDOW).
+		Uses Skip ROM when every sensor is due, otherwise Match ROM + Convert T
+		per sensor, then waits for slowest conversion in group.
+		Returns list of (sensor index, scratchpad or None if no presence or
+		sensor was not at its configured resolution).
+		"""
+		if self.configured < len(romCodes):
+			self.configure(controller, romCodes)
+
+		now = time.time()
+		due = [i for i in range(len(romCodes)) if self.nextDue[i] <= now + GROUP_WINDOW]
+		if not due:
+			return []
+
+		started = set()			# sensors whose conversion was started
+		if len(due) == len(romCodes):
+			# Bus reads 1 only once every sensor is done, so polling works
+			if controller.DS2482_owStartConversion():
+				controller.DS2482_owWaitForConversion()
+				started.update(due)
+			else:
+				print("*** No presence pulse; temperature conversion not started")
+		else:
+			# Polling would only reflect last sensor addressed; wait for slowest instead
+			doneTime = now
+			for sensor in due:
+				if controller.DS2482_owStartConversion(romCodes[sensor]):
+					doneTime = max(doneTime, time.time() + CONVERSION_TIME[self.rates[sensor][1]])
+					started.add(sensor)
+			remaining = doneTime - time.time()
+			if remaining > 0:
+				time.sleep(remaining)
+
+		readings = []
+		for sensor in due:
+			# Sensor not converting is treated as absent
+			if sensor in started:
+				readings.append((sensor, self.checkResolution(controller, romCodes, sensor,
+					readScratchpad(controller, romCodes[sensor]))))
+			else:
+				readings.append((sensor, None))
+
+			# Next due time; skip missed periods rather than bursting to catch up
+			period = self.rates[sensor][0]
+			self.nextDue[sensor] += period
+			if self.nextDue[sensor] < now:
+				self.nextDue[sensor] = now + period
+
+		return readings
+
+	#________________________________________________
+	def checkResolution(self, controller, romCodes, sensor, scratchPad):
+		"""Return scratchPad, or None if its configuration byte shows sensor has
+		lost its resolution (e.g. after a power cycle); resolution is then set again.
+		Scratchpads failing CRC are returned for caller to reject.
+		"""
+		bits = self.rates[sensor][1]
+		if scratchPad is None or DS2482.owCrc8(scratchPad) != 0 or scratchPad[4] == RESOLUTION_CONFIG[bits]:
+			return scratchPad
+
+		# Conversion wait was sized for configured resolution, so value may be stale
+		print("*** Sensor %d not at %d-bit resolution; reading dropped" % (sensor, bits))
+		if not setResolution(controller, romCodes[sensor], bits):
+			print("*** Resolution not set for sensor %d" % (sensor))
+		return None
@@ -1,9 +1,12 @@
 """
 Routines for accessing DS2482-100 and connected 1-wire devices.
 
-Last touched: 08/16/2017
+Last touched: 10/18/2026
 """
 
+import array
+import time
+
 # --- Constants ---
 DEFAULT_ADDRESS		= 0x18		# 00110<AD1><AD0>
 
@@ -22,6 +25,45 @@ DS2482_STATUS_SBR	= 0x20;		# Single Bit Result
 DS2482_STATUS_TSB	= 0x40;		# Triplet Second Bit
 DS2482_STATUS_DIR	= 0x80;		# Branch Direction Taken
 
+# 1-Wire ROM commands
+OW_SEARCH_ROM	= 0xF0
+OW_MATCH_ROM	= 0x55
+OW_SKIP_ROM		= 0xCC
+
+# DS18B20 function commands
+OW_CONVERT_T	= 0x44
+
+# DS18B20 conversion timing (seconds)
+CONVERSION_FIXED_WAIT	= 0.8		# fixed wait; 750 ms for 12 bits plus margin
+CONVERSION_TIMEOUT		= 1.0		# give up polling after this long
+CONVERSION_PRESLEEP		= 0.9		# fraction of learned conversion time to sleep before polling
+
+# Dallas/Maxim 1-Wire CRC8 lookup table (X^8 + X^5 + X^4 + 1)
+CRC_TABLE = [0, 94, 188, 226, 97, 63, 221, 131, 194, 156, 126, 32, 163, 253, 31, 65,
+			 157, 195, 33, 127, 252, 162, 64, 30, 95, 1, 227, 189, 62, 96, 130, 220,
+			 35, 125, 159, 193, 66, 28, 254, 160, 225, 191, 93, 3, 128, 222, 60, 98,
+			 190, 224, 2, 92, 223, 129, 99, 61, 124, 34, 192, 158, 29, 67, 161, 255,
+			 70, 24, 250, 164, 39, 121, 155, 197, 132, 218, 56, 102, 229, 187, 89, 7,
+			 219, 133, 103, 57, 186, 228, 6, 88, 25, 71, 165, 251, 120, 38, 196, 154,
+			 101, 59, 217, 135, 4, 90, 184, 230, 167, 249, 27, 69, 198, 152, 122, 36,
+			 248, 166, 68, 26, 153, 199, 37, 123, 58, 100, 134, 216, 91, 5, 231, 185,
+			 140, 210, 48, 110, 237, 179, 81, 15, 78, 16, 242, 172, 47, 113, 147, 205,
+			 17, 79, 173, 243, 112, 46, 204, 146, 211, 141, 111, 49, 178, 236, 14, 80,
+			 175, 241, 19, 77, 206, 144, 114, 44, 109, 51, 209, 143, 12, 82, 176, 238,
+			 50, 108, 142, 208, 83, 13, 239, 177, 240, 174, 76, 18, 145, 207, 45, 115,
+			 202, 148, 118, 40, 171, 245, 23, 73, 8, 86, 180, 234, 105, 55, 213, 139,
+			 87, 9, 235, 181, 54, 104, 138, 212, 149, 203, 41, 119, 244, 170, 72, 22,
+			 233, 183, 85, 11, 136, 214, 52, 106, 43, 117, 151, 201, 74, 20, 246, 168,
+			 116, 42, 200, 150, 21, 75, 169, 247, 182, 232, 10, 84, 215, 137, 107, 53]
+
+#________________________________________________
+def owCrc8(data):
+	"""Return 1-Wire CRC8 of data; 0 if data includes valid trailing CRC byte"""
+	crc8 = 0
+	for byte in data:
+		crc8 = CRC_TABLE[crc8 ^ byte]
+	return crc8
+
 class DS2482(object):
 	"""Driver for interfacing with Maxim DS2482-100 Single-Channel 1-Wire Master."""
 
@@ -34,6 +76,15 @@ class DS2482(object):
 			import Adafruit_GPIO.I2C as I2C
 			i2c = I2C
 		self._device = i2c.get_i2c_device(address, **kwargs)
+		
+		# Track read pointer and 1-Wire busy state so redundant
+		#  Set Read Pointer writes and status polls can be skipped
+		self._readPointer = None		# unknown until first command
+		self._owIdle = False
+		
+		# Conversion time learned from polling, per 1-Wire bus
+		self.conversionTime = 0.75
+		self._conversionStart = None	# None while no conversion has been started
 
 	#________________________________________________
 	def DS2482_reset(self):
@@ -45,6 +96,8 @@ class DS2482(object):
 		# Configuration Bits Affected: 1WS = APU = SPU = 0
 		# Returns True if device reset, False if problem or no device
 		self._device.writeRaw8(0xF0)
+		self._readPointer = DS2482_STATUS_REG
+		self._owIdle = True
 		response = self._device.readRaw8()
 		if (response & DS2482_STATUS_RST) == DS2482_STATUS_RST:
 			return True
@@ -60,7 +113,10 @@ class DS2482(object):
 		# Status Bits Affected: None
 		# Configuration Bits Affected: None
 		# Returns True
-		self._device.write8(0xE1,ptrCode)
+		# Skips I2C write if read pointer already in place
+		if self._readPointer != ptrCode:
+			self._device.write8(0xE1,ptrCode)
+			self._readPointer = ptrCode
 		return True
 	
 	#________________________________________________
@@ -71,7 +127,9 @@ class DS2482(object):
 		# Status Bits Affected: RST = 0
 		# Configuration Bits Affected: 1WS, SPU & APU updated
 		# Returns True if success, False if problem
+		self.waitForOWBusAvailable()
 		self._device.write8(0xD2,(config | (~config<<4)))
+		self._readPointer = DS2482_CONFIG_REG
 		response = self._device.readRaw8()
 		if response == config:
 			return True
@@ -87,29 +145,29 @@ class DS2482(object):
 		# Status Bits Affected: 1WB, PPD, SD
 		# Configuration Bits Affected: 1WS, APU, SPU
 		# Returns True if no issue, False if problem or no device
-		stillWaiting = True
 		self.waitForOWBusAvailable()
-		self._device.writeRaw8(0xB4)
+		
+		# Issue command and read status in one I2C transaction (repeated start)
+		response = self._device.readU8(0xB4)
+		self._readPointer = DS2482_STATUS_REG
 		
 		# Loop while checking 1WB for completion of 1-Wire operation
 		# Don't use waitForOWBusAvailable here because we want to
 		#  check several status bits after waiting
-		while stillWaiting:
+		while response & DS2482_STATUS_1WB:		# 1WBusy = 1 if busy
 			response = self._device.readRaw8()
-			if response & DS2482_STATUS_1WB:		# 1WBusy = 1 if busy
-				pass
-			else:
-				stillWaiting = False
+		self._owIdle = True
 		
 		# Check for short condition
 		if response & DS2482_STATUS_SD:
 			print "  *** 1-Wire short detected"
+			return False
 		
 		# Check for presence detect
 #		if response & DS2482_STATUS_PPD:
 #			print "  1-Wire presence pulse detected"
 		
-		return True
+		return (response & DS2482_STATUS_PPD) == DS2482_STATUS_PPD
 	
 	#________________________________________________
 	def DS2482_owWriteByte(self,data):
@@ -119,8 +177,10 @@ class DS2482(object):
 		# Status Bits Affected: 1WB (set to 1 for 8 x tSLOT)
 		# Configuration Bits Affected: 1WS, APU, SPU
 		# Returns True
-	 	self.waitForOWBusAvailable()
+		self.waitForOWBusAvailable()
 		self._device.write8(0xA5,data)
+		self._readPointer = DS2482_STATUS_REG
+		self._owIdle = False
 		return True
 	
 	#________________________________________________
@@ -135,13 +195,203 @@ class DS2482(object):
 		# Configuration Bits Affected: 1WS, APU
 		# Returns True
 		self.waitForOWBusAvailable()
-		self._device.writeRaw8(0x96)
+		
+		# Issue command and read status in one I2C transaction (repeated start)
+		response = self._device.readU8(0x96)
+		self._readPointer = DS2482_STATUS_REG
+		self._owIdle = (response & DS2482_STATUS_1WB) == 0
 		return True
 	
+	#________________________________________________
+	def DS2482_owReadBit(self):
+		# Generates single read-data time slot (1-Wire Single Bit with bit = 1)
+		# Restriction: 1-Wire activity must have ended (1WB = 0)
+		# Read Pointer Position: Status Register
+		# Status Bits Affected: 1WB (set to 1 for tSLOT), SBR
+		# Configuration Bits Affected: 1WS, APU, SPU
+		# Returns bit read from 1-Wire line (0 or 1)
+		self.waitForOWBusAvailable()
+		self._device.write8(0x87,0x80)
+		self._readPointer = DS2482_STATUS_REG
+		
+		response = self._device.readRaw8()
+		while response & DS2482_STATUS_1WB:
+			response = self._device.readRaw8()
+		self._owIdle = True
+		if response & DS2482_STATUS_SBR:
+			return 1
+		else:
+			return 0
+	
+	#________________________________________________
+	def DS2482_owReadDataByte(self):
+		# Generates eight read-data time slots and returns byte received
+		# Waits for 1-Wire activity to end before moving read pointer
+		#  to Read Data Register
+		# Read Pointer Position: Read Data Register
+		# Returns byte read from 1-Wire line
+		self.DS2482_owReadByte()
+		self.waitForOWBusAvailable()
+		self.DS2482_setReadPointer(DS2482_READ_DATA_REG)
+		return self._device.readRaw8()
+	
+	#________________________________________________
+	def DS2482_owTransaction(self,txBytes,rxCount=0,reset=True):
+		# Performs complete 1-Wire transaction as one sequence:
+		#  optional reset/presence-detect, write txBytes, then read rxCount bytes
+		# e.g. Match ROM + ROM code + Read Scratchpad, then 9 reads
+		# Read pointer and bus state are tracked across the sequence, so each
+		#  written byte costs one write + status poll and each read byte one
+		#  command/status read + pointer move + data read (plus any busy polls)
+		# Returns array of bytes read, or None if no presence pulse
+		if reset and not self.DS2482_owReset():
+			return None
+		
+		for data in txBytes:
+			self.DS2482_owWriteByte(data)
+		
+		rxBytes = array.array('B')
+		for i in range(rxCount):
+			rxBytes.append(self.DS2482_owReadDataByte())
+		return rxBytes
+	
+	#________________________________________________
+	def DS2482_owStartConversion(self,rom=None):
+		# Starts DS18B20 temperature conversion on all devices (Skip ROM)
+		#  or on one device if rom is given (Match ROM)
+		# Returns True if conversion started, False if no presence pulse
+		if not self.DS2482_owReset():
+			self._conversionStart = None
+			return False
+		
+		if rom is None:
+			self.DS2482_owWriteByte(OW_SKIP_ROM)
+		else:
+			self.DS2482_owWriteByte(OW_MATCH_ROM)
+			for data in rom:
+				self.DS2482_owWriteByte(data)
+		self.DS2482_owWriteByte(OW_CONVERT_T)
+		self._conversionStart = time.time()
+		return True
+	
+	#________________________________________________
+	def DS2482_owWaitForConversion(self,poll=True,timeout=CONVERSION_TIMEOUT):
+		# Waits for conversion started by DS2482_owStartConversion
+		# poll = False: sleeps fixed CONVERSION_FIXED_WAIT; required for
+		#  parasite-powered sensors, which cannot signal completion
+		# poll = True: sleeps most of learned conversion time, then issues read
+		#  time slots until sensors release bus (read 1); converting sensors
+		#  hold bus low
+		# Returns True if conversion complete, False if polling timed out or
+		#  no conversion was started (nothing on bus would release it)
+		if self._conversionStart is None:
+			return False
+		if not poll:
+			remaining = self._conversionStart + CONVERSION_FIXED_WAIT - time.time()
+			if remaining > 0:
+				time.sleep(remaining)
+			return True
+		
+		remaining = self._conversionStart + CONVERSION_PRESLEEP * self.conversionTime - time.time()
+		if remaining > 0:
+			time.sleep(remaining)
+		
+		busyPolls = 0
+		while not self.DS2482_owReadBit():
+			busyPolls += 1
+			if time.time() - self._conversionStart > timeout:
+				print "*** Temperature conversion timed out"
+				return False
+		
+		# Learn conversion time; if conversion already ended during pre-sleep
+		#  the true time is unknown, so halve estimate and measure next time
+		elapsed = time.time() - self._conversionStart
+		if busyPolls:
+			self.conversionTime = elapsed
+		else:
+			self.conversionTime = elapsed / 2.0
+		return True
+	
+	#________________________________________________
+	def DS2482_owTriplet(self,direction):
+		# Generates three time slots: two read slots and one write slot
+		# Direction byte bit 7 chooses branch taken if both read bits are 0
+		# Restriction: 1-Wire activity must have ended (1WB = 0)
+		# Read Pointer Position: Status Register
+		# Status Bits Affected: 1WB, SBR, TSB, DIR
+		# Configuration Bits Affected: 1WS, APU
+		# Returns status byte after triplet completes
+		self.waitForOWBusAvailable()
+		if direction:
+			self._device.write8(0x78,0x80)
+		else:
+			self._device.write8(0x78,0x00)
+		self._readPointer = DS2482_STATUS_REG
+		
+		response = self._device.readRaw8()
+		while response & DS2482_STATUS_1WB:
+			response = self._device.readRaw8()
+		self._owIdle = True
+		return response
+	
+	#________________________________________________
+	def DS2482_owSearch(self):
+		# Performs 1-Wire Search ROM, using Triplet command for each ROM bit
+		# Returns list of 8-byte ROM codes (family code first), CRC checked
+		romCodes = []
+		romBits = [0] * 64
+		lastDiscrepancy = -1
+		lastDevice = False
+		
+		while not lastDevice:
+			if not self.DS2482_owReset():
+				break						# no devices on bus
+			self.DS2482_owWriteByte(OW_SEARCH_ROM)
+			
+			lastZero = -1
+			for bit in range(64):
+				if bit < lastDiscrepancy:
+					direction = romBits[bit]
+				elif bit == lastDiscrepancy:
+					direction = 1
+				else:
+					direction = 0
+				
+				response = self.DS2482_owTriplet(direction)
+				idBit   = response & DS2482_STATUS_SBR
+				cmpBit  = response & DS2482_STATUS_TSB
+				taken   = response & DS2482_STATUS_DIR
+				if idBit and cmpBit:		# no device responded
+					print "*** 1-Wire search failed at bit %d" % (bit)
+					return romCodes
+				
+				if not idBit and not cmpBit and not taken:
+					lastZero = bit
+				romBits[bit] = 1 if taken else 0
+			
+			rom = [0] * 8
+			for bit in range(64):
+				if romBits[bit]:
+					rom[bit >> 3] |= 1 << (bit & 0x07)
+			if owCrc8(rom) == 0:
+				romCodes.append(rom)
+			else:
+				print "*** 1-Wire search ROM CRC BAD: %s" % (" ".join(["%02X" % b for b in rom]))
+			
+			lastDiscrepancy = lastZero
+			if lastDiscrepancy == -1:
+				lastDevice = True
+		
+		return romCodes
+	
 	#________________________________________________
 	def waitForOWBusAvailable(self):
 		# Reads DS2482 Status Register and returns when 1-Wire bus is not busy
 		# or if cycle count exceeds threshold
+		# Returns immediately if bus already known to be idle
+		if self._owIdle:
+			return
+		
 		stillWaiting = True
 		cycles = 0
 		
@@ -152,6 +402,7 @@ class DS2482(object):
 				pass
 			else:
 				stillWaiting = False
+				self._owIdle = True
 				
 			cycles += 1
 			if cycles > 10:
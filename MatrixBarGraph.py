@@ -0,0 +1,73 @@
+"""
+Bar graph of readings on an Adafruit Matrix8x8 (HT16K33 backpack).
+
+Each reading gets one matrix column (y); the bar grows from x=7 towards x=0,
+one pixel for every threshold the reading is above. Bar heights come from
+a bisect into the threshold list and each column's byte from a table, so
+nothing is tested pixel by pixel. The bytes last written to the display are
+kept as a shadow framebuffer, and only columns whose byte has changed are
+sent over I2C.
+Last touched: 10/18/2026
+"""
+
+import bisect
+import time
+
+BAR_THRESHOLDS = [0, 20, 40, 60, 80, 100, 120, 140]	# deg F; one pixel lit per threshold exceeded
+
+# Matrix8x8.set_pixel(x, y) sets bit (x+7)%8 of HT16K33 display RAM byte 2*y
+#  (odd bytes are unused on an 8x8). BAR_BYTES[h] lights x = 7 down to 8-h.
+BAR_BYTES = [sum([1 << ((x + 7) % 8) for x in range(8 - height, 8)]) for height in range(9)]
+
+class MatrixBarGraph(object):
+	"""Draws readings as bars, writing only display bytes that change."""
+
+	#________________________________________________
+	def __init__(self, display, columns, thresholds=BAR_THRESHOLDS):
+		self.display = display			# Matrix8x8, begin() already called
+		self.columns = columns			# matrix column (y) for each reading
+		self.thresholds = thresholds	# ascending, at most 8
+		self.shadow = bytearray(8)		# byte last written for each column
+		self.writes = 0					# I2C byte writes, for comparison
+
+	#________________________________________________
+	def barHeight(self, value):
+		"""Number of thresholds value is strictly above"""
+		return bisect.bisect_left(self.thresholds, value)
+
+	#________________________________________________
+	def clear(self):
+		"""Blank whole display and shadow"""
+		self.display.clear()
+		self.display.write_display()
+		self.shadow = bytearray(8)
+
+	#________________________________________________
+	def show(self, readings):
+		"""Draw readings (one per column); returns number of columns written"""
+		frame = bytearray(8)
+		for value, column in zip(readings, self.columns):
+			frame[column] = BAR_BYTES[self.barHeight(value)]
+		written = 0
+		for column in range(8):
+			if frame[column] != self.shadow[column]:
+				self.writeColumn(column, frame[column])
+				written += 1
+		return written
+
+	#________________________________________________
+	def writeColumn(self, column, byte):
+		# Keep library's buffer in step, then send one byte instead of all 16
+		self.display.buffer[2 * column] = byte
+		self.display._device.write8(2 * column, byte)
+		self.shadow[column] = byte
+		self.writes += 1
+
+	#________________________________________________
+	def selfTest(self, delay=0.1):
+		"""Light each pixel in turn, x and y from 7 down to 0, then blank"""
+		for column in range(7, -1, -1):
+			for x in range(7, -1, -1):
+				self.writeColumn(column, 1 << ((x + 7) % 8))
+				time.sleep(delay)
+			self.writeColumn(column, 0)
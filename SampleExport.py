@@ -0,0 +1,181 @@
+"""
+JSON and CSV export of SampleStore data, for HTTP clients.
+
+An Export is resolved from a request (latest sample, a time range, or one
+sensor's series) without reading any samples: it only finds the day files
+involved, and their names, sizes and modification times give its ETag and
+Last-Modified. Since the store is append-only, an unchanged ETag means an
+unchanged body, so a conditional request can be answered without
+formatting anything. chunks() then formats the body a block of records at
+a time straight from the mmapped day files.
+
+JSON bodies are {"labels": [...], "sensors": [...], "rows": [[time, value, ...], ...]};
+CSV bodies are a "time,<label>,..." header and one line per sample. Invalid
+readings are null in JSON and empty in CSV.
+Last touched: 10/18/2026
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+import SampleStore
+
+FORMATS = {"json": "application/json", "csv": "text/csv"}
+CHUNK_ROWS = 256			# samples formatted per chunk
+
+class Export(object):
+	"""Samples selected by one request, with the validators for them."""
+
+	#________________________________________________
+	def __init__(self, directory, prefix, kind, params):
+		"""kind is "latest", "range" or "series/<sensor>"; params maps query
+		names (start, end, sensors, format) to strings. ValueError if
+		request is bad, LookupError if store has no readable files. Files
+		that are not readable store files are left out.
+		"""
+		# Only names are listed here; just the files request selects are opened
+		allPaths = SampleStore.storeFiles(directory, prefix)
+		self.format = params.get("format", "json")
+		if self.format not in FORMATS:
+			raise ValueError("format must be one of %s" % ", ".join(sorted(FORMATS)))
+		self.contentType = FORMATS[self.format]
+		self.lastOnly = (kind == "latest")
+
+		header = None
+		if self.lastOnly:
+			# Newest first; usually only today's file is opened
+			self.start = self.end = None
+			self.paths = []
+			for path in reversed(allPaths):
+				storeFile = self.header(path)
+				if storeFile is None:
+					continue
+				if header is None:
+					header = storeFile
+				if storeFile.count > 0:
+					self.paths = [path]
+					break
+		elif kind == "range" or kind.startswith("series/"):
+			self.end = self.epoch(params, "end")
+			self.start = self.epoch(params, "start")
+			if self.start is None:
+				self.start = SampleStore.dayStart(self.end if self.end is not None else time.time())
+			# Records are never newer than now, so an open end can stand for now
+			first = SampleStore.dayStart(self.start)
+			last = self.end if self.end is not None else time.time()
+			self.paths = [path for path in allPaths
+				if first <= SampleStore.fileDay(path) <= last and self.header(path) is not None]
+		else:
+			raise ValueError("unknown request %s" % kind)
+
+		# Labels from newest readable file, in case range holds none
+		if header is None:
+			for path in reversed(allPaths):
+				header = self.header(path)
+				if header is not None:
+					break
+		if header is None:
+			raise LookupError("no samples stored as %s" % prefix)
+		numChannels = header.numChannels
+		if kind.startswith("series/"):
+			self.sensors = [int(kind[len("series/"):])]
+		elif "sensors" in params:
+			self.sensors = [int(field) for field in params["sensors"].split(",")]
+		else:
+			self.sensors = list(range(numChannels))
+		for sensor in self.sensors:
+			if not 0 <= sensor < numChannels:
+				raise ValueError("no sensor %d" % sensor)
+		self.labels = [header.labels[sensor] for sensor in self.sensors]
+
+		stats = [(os.path.basename(path), os.stat(path)) for path in self.paths]
+		self.sizes = [stat.st_size for name, stat in stats]	# body stops here, matching ETag
+		identity = (self.lastOnly, self.start, self.end, self.sensors, self.format,
+			[(name, stat.st_size, stat.st_mtime) for name, stat in stats])
+		self.etag = '"%s"' % hashlib.sha1(repr(identity).encode('latin-1')).hexdigest()[:20]
+		self.lastModified = max([stat.st_mtime for name, stat in stats] or [0.0])
+
+	#________________________________________________
+	def epoch(self, params, name):
+		"""Return finite epoch seconds from params, or None if absent"""
+		if name not in params:
+			return None
+		value = float(params[name])
+		if math.isnan(value) or math.isinf(value):
+			raise ValueError("%s must be a finite number of seconds" % name)
+		return value
+
+	#________________________________________________
+	def header(self, path):
+		"""Return closed StoreFile giving path's header and record count, or
+		None if path is not a readable store file
+		"""
+		try:
+			storeFile = SampleStore.StoreFile(path)
+		except ValueError as e:
+			print("*** Skipping %s" % e)
+			return None
+		storeFile.close()
+		return storeFile
+
+	#________________________________________________
+	def chunks(self):
+		"""Generate body as bytes, CHUNK_ROWS samples at a time"""
+		if self.format == "json":
+			yield ('{"labels": %s, "sensors": %s, "rows": [' %
+				(json.dumps(self.labels), json.dumps(self.sensors))).encode('latin-1')
+			separator = ""
+			for rows in self.rowBlocks(self.jsonRow):
+				yield (separator + ",".join(rows)).encode('latin-1')
+				separator = ","
+			yield b"]}\n"
+		else:
+			yield (",".join(["time"] + [label.replace(",", " ") for label in self.labels]) + "\n").encode('latin-1')
+			for rows in self.rowBlocks(self.csvRow):
+				yield ("\n".join(rows) + "\n").encode('latin-1')
+
+	#________________________________________________
+	def rowBlocks(self, formatRow):
+		"""Generate lists of up to CHUNK_ROWS formatted rows"""
+		for path, size in zip(self.paths, self.sizes):
+			try:
+				storeFile = SampleStore.StoreFile(path)
+			except ValueError as e:
+				print("*** Skipping %s" % e)		# replaced since request was resolved
+				continue
+			try:
+				count = min(storeFile.count, (size - storeFile.headerSize) // storeFile.recordSize)
+				if self.lastOnly:
+					index = count - 1
+				else:
+					index = min(storeFile.findTime(self.start), count)
+				rows = []
+				while index < count:
+					timestamp, valid, values = storeFile.read(index)
+					if self.end is not None and timestamp > self.end:
+						break
+					rows.append(formatRow(timestamp, valid, values))
+					if len(rows) == CHUNK_ROWS:
+						yield rows
+						rows = []
+					index += 1
+				if rows:
+					yield rows
+			finally:
+				storeFile.close()
+
+	#________________________________________________
+	def jsonRow(self, timestamp, valid, values):
+		fields = ["%.3f" % timestamp]
+		for sensor in self.sensors:
+			fields.append("%.2f" % values[sensor] if sensor < len(values) and (valid >> sensor) & 1 else "null")
+		return "[" + ",".join(fields) + "]"
+
+	#________________________________________________
+	def csvRow(self, timestamp, valid, values):
+		fields = ["%.3f" % timestamp]
+		for sensor in self.sensors:
+			fields.append("%.2f" % values[sensor] if sensor < len(values) and (valid >> sensor) & 1 else "")
+		return ",".join(fields)
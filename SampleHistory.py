@@ -0,0 +1,200 @@
+"""
+Fixed-capacity columnar ring buffer of sensor readings.
+
+One array('d') per sensor plus an epoch timestamp array; appending is O(1)
+and memory stays flat once the retention window is full. Every sample gets
+a sequence number so clients can ask for just what they have not seen;
+reads never modify the buffer. Text is only built when a client asks for it.
+Queries see a reading only in the sample it was taken for; the legacy
+download also shows readings carried forward (ReadingFrame.held).
+Last touched: 10/18/2026
+"""
+
+import array
+import struct
+import sys
+import time
+
+INVALID_VALUE = -999		# value reported to legacy clients for missing readings
+
+# Binary download format, all little-endian:
+#  header: magic, next seq, sample count, base epoch, number of sensors
+#  sensor numbers, one uint8 each
+#  uint32 milliseconds since base epoch, one per sample
+#  for each sensor, int16 hundredths of a degree per sample (INVALID_CENTI if invalid)
+BINARY_MAGIC	= b"TSH1"
+BINARY_HEADER	= struct.Struct("<4sIIdH")
+INVALID_CENTI	= -32768
+
+class SampleHistory(object):
+	"""Ring buffer holding the most recent capacity samples of numSensors sensors."""
+
+	#________________________________________________
+	def __init__(self, numSensors, capacity):
+		self.numSensors = numSensors
+		self.capacity = capacity
+		self.times = array.array('d', [0.0] * capacity)
+		self.valid = array.array('L', [0] * capacity)
+		self.held = array.array('L', [0] * capacity)		# good values, fresh or carried forward
+		self.columns = [array.array('d', [0.0] * capacity) for i in range(numSensors)]
+		self.head = 0		# physical index of next slot to write
+		self.count = 0		# number of samples held
+		self.seq = 0		# sequence number of next sample appended
+
+	#________________________________________________
+	def append(self, frame):
+		"""Store ReadingFrame, overwriting oldest sample once full"""
+		head = self.head
+		self.times[head] = frame.timestamp
+		values = frame.values
+		numValues = min(len(values), self.numSensors)
+		for sensor in range(numValues):
+			self.columns[sensor][head] = values[sensor]
+		self.valid[head] = frame.valid & ((1 << numValues) - 1)
+		self.held[head] = frame.held & ((1 << numValues) - 1)
+
+		self.head = (head + 1) % self.capacity
+		if self.count < self.capacity:
+			self.count += 1
+		self.seq += 1
+
+	#________________________________________________
+	def firstSeq(self):
+		"""Return sequence number of oldest sample held"""
+		return self.seq - self.count
+
+	#________________________________________________
+	def select(self, sinceSeq=None, afterTime=None):
+		"""Return (first, n): logical position and number of held samples with
+		sequence number >= sinceSeq and timestamp > afterTime.
+		"""
+		first = 0
+		if sinceSeq is not None:
+			first = max(0, sinceSeq - self.firstSeq())
+		if afterTime is not None:
+			# Binary search; timestamps increase with position
+			lo = first
+			hi = self.count
+			base = self.head - self.count
+			while lo < hi:
+				mid = (lo + hi) // 2
+				if self.times[(base + mid) % self.capacity] > afterTime:
+					hi = mid
+				else:
+					lo = mid + 1
+			first = lo
+		first = min(first, self.count)
+		return first, self.count - first
+
+	#________________________________________________
+	def spans(self, first=0, n=None):
+		"""Return physical (start, stop) index ranges, oldest first, covering
+		n samples beginning at logical position first (0 = oldest held).
+		At most two ranges, since the buffer wraps at most once.
+		"""
+		if n is None:
+			n = self.count - first
+		if n <= 0:
+			return []
+		start = (self.head - self.count + first) % self.capacity
+		stop = start + n
+		if stop <= self.capacity:
+			return [(start, stop)]
+		return [(start, self.capacity), (0, stop - self.capacity)]
+
+	#________________________________________________
+	def column(self, sensor, first=0, n=None):
+		"""Return list of readings for one sensor, carried forward where not
+		read for a sample; INVALID_VALUE where no good reading was held
+		"""
+		values = self.columns[sensor]
+		held = self.held
+		bit = 1 << sensor
+		result = []
+		for start, stop in self.spans(first, n):
+			for i in range(start, stop):
+				if held[i] & bit:
+					result.append(values[i])
+				else:
+					result.append(INVALID_VALUE)
+		return result
+
+	#________________________________________________
+	def timestamps(self, first=0, n=None):
+		result = []
+		for start, stop in self.spans(first, n):
+			result.extend(self.times[start:stop])
+		return result
+
+	#________________________________________________
+	def legacyString(self, columnOrder, first=0, n=None):
+		"""Serialize held samples in original BeagleBoneClient2 format:
+		count, then comma-terminated ctime strings, then each sensor column
+		in columnOrder, all comma-terminated.
+		"""
+		if n is None:
+			n = self.count - first
+		parts = [str(n), ","]
+		for t in self.timestamps(first, n):
+			parts.append(time.ctime(t))
+			parts.append(",")
+		for sensor in columnOrder:
+			for value in self.column(sensor, first, n):
+				parts.append(str(value))
+				parts.append(",")
+		return "".join(parts)
+
+	#________________________________________________
+	def binaryBuffers(self, first, n, sensors):
+		"""Pack samples in binary download format, column by column.
+		Returns list of buffers to be sent in order; no per-sample text.
+		"""
+		spans = self.spans(first, n)
+		baseEpoch = 0.0
+		if spans:
+			baseEpoch = self.times[spans[0][0]]
+
+		deltas = array.array('I')
+		for start, stop in spans:
+			deltas.extend([int((t - baseEpoch) * 1000.0 + 0.5) for t in self.times[start:stop]])
+
+		buffers = [BINARY_HEADER.pack(BINARY_MAGIC, self.seq, n, baseEpoch, len(sensors)),
+				   array.array('B', sensors), deltas]
+		for sensor in sensors:
+			values = self.columns[sensor]
+			valid = self.valid
+			bit = 1 << sensor
+			centi = array.array('h')
+			for start, stop in spans:
+				for i in range(start, stop):
+					if valid[i] & bit:
+						centi.append(max(-32767, min(32767, int(round(values[i] * 100.0)))))
+					else:
+						centi.append(INVALID_CENTI)
+			buffers.append(centi)
+
+		if sys.byteorder == 'big':
+			for buf in buffers[2:]:
+				buf.byteswap()
+		return buffers
+
+	#________________________________________________
+	def rowsString(self, first, n, sensors):
+		"""Serialize samples as text, one line per sample:
+		header "<next seq>,<n>,<sensor>;<sensor>..." then "<seq>,<epoch>,<value>,..."
+		with an empty field for invalid readings.
+		"""
+		lines = ["%d,%d,%s\n" % (self.seq, n, ";".join([str(sensor) for sensor in sensors]))]
+		seq = self.firstSeq() + first
+		for start, stop in self.spans(first, n):
+			for i in range(start, stop):
+				fields = ["%d" % seq, repr(self.times[i])]
+				valid = self.valid[i]
+				for sensor in sensors:
+					if valid & (1 << sensor):
+						fields.append(repr(self.columns[sensor][i]))
+					else:
+						fields.append("")
+				lines.append(",".join(fields) + "\n")
+				seq += 1
+		return "".join(lines)
@@ -0,0 +1,293 @@
+"""
+Append-only on-disk time-series store for sensor samples.
+
+One file per (UTC) day, each a fixed header followed by fixed-size records,
+so any sample is found by offset arithmetic. Files are written by appending
+and read through mmap. A torn record left by a crash is trimmed on open.
+Last touched: 10/18/2026
+"""
+
+import calendar
+import mmap
+import os
+import struct
+import time
+
+# File header: magic, version, number of channels, record size, header size, creation epoch
+#  followed by one LABEL_SIZE-byte, NUL-padded label per channel
+STORE_MAGIC		= b"TSS1"
+STORE_VERSION	= 1
+FILE_HEADER		= struct.Struct("<4sHHIId")
+LABEL_SIZE		= 24
+
+# Record: epoch seconds, validity bitmask, then one float per channel
+RECORD_PREFIX	= "<dI"
+
+DAY_SECONDS		= 24 * 3600
+
+#________________________________________________
+def recordStruct(numChannels):
+	return struct.Struct(RECORD_PREFIX + "f" * numChannels)
+
+#________________________________________________
+def dayStart(timestamp):
+	"""Return epoch of UTC midnight on or before timestamp"""
+	return int(timestamp // DAY_SECONDS) * DAY_SECONDS
+
+#________________________________________________
+def dayFileName(directory, prefix, timestamp):
+	return os.path.join(directory, "%s-%s.tss" % (prefix, time.strftime("%Y%m%d", time.gmtime(timestamp))))
+
+#________________________________________________
+def dayFiles(directory, prefix, startTime, endTime):
+	"""Return paths of existing day files covering startTime..endTime"""
+	# Filter directory listing rather than step through days, so cost does
+	#  not depend on how far apart startTime and endTime are
+	first = dayStart(startTime)
+	return [path for path in storeFiles(directory, prefix) if first <= fileDay(path) <= endTime]
+
+#________________________________________________
+def storeFiles(directory, prefix):
+	"""Return paths of all day files with prefix, oldest first"""
+	if not os.path.isdir(directory):
+		return []
+	names = [name for name in os.listdir(directory)
+			 if name.startswith(prefix + "-") and name.endswith(".tss") and len(name) == len(prefix) + 13
+			 and name[-12:-4].isdigit()]
+	return [os.path.join(directory, name) for name in sorted(names)]
+
+#________________________________________________
+def fileDay(path):
+	"""Return epoch of UTC midnight starting day file's day"""
+	date = path[-12:-4]		# YYYYMMDD; strptime is too slow for whole listings
+	return calendar.timegm((int(date[:4]), int(date[4:6]), int(date[6:]), 0, 0, 0))
+
+class StoreFile(object):
+	"""Read-only, memory-mapped view of one day file."""
+
+	#________________________________________________
+	def __init__(self, path):
+		"""ValueError if path is not a store file or is cut short in its header"""
+		self.path = path
+		self._file = open(path, 'rb')
+		self._map = None
+		self._size = 0
+		header = self._file.read(FILE_HEADER.size)
+		if len(header) < FILE_HEADER.size:
+			self._file.close()
+			raise ValueError("%s is shorter than a sample store header" % path)
+		magic, version, numChannels, recordSize, headerSize, created = FILE_HEADER.unpack(header)
+		if magic != STORE_MAGIC or version != STORE_VERSION:
+			self._file.close()
+			raise ValueError("%s is not a sample store file" % path)
+		self.numChannels = numChannels
+		self.recordSize = recordSize
+		self.headerSize = headerSize
+		self.created = created
+		self.record = recordStruct(numChannels)
+		labels = self._file.read(LABEL_SIZE * numChannels)
+		if len(labels) < LABEL_SIZE * numChannels:
+			self._file.close()
+			raise ValueError("%s is shorter than a sample store header" % path)
+		self.labels = [labels[i:i+LABEL_SIZE].rstrip(b"\0").decode('latin-1')
+					   for i in range(0, LABEL_SIZE * numChannels, LABEL_SIZE)]
+		self.count = 0
+		self.refresh()
+
+	#________________________________________________
+	def refresh(self):
+		"""Re-map file if writer has appended since last look; returns record count"""
+		size = os.fstat(self._file.fileno()).st_size
+		if size != self._size:
+			if self._map is not None:
+				self._map.close()
+			self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+			self._size = size
+			self.count = (size - self.headerSize) // self.recordSize
+		return self.count
+
+	#________________________________________________
+	def close(self):
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		self._file.close()
+
+	#________________________________________________
+	def read(self, index):
+		"""Return (timestamp, valid, values tuple) of record at index"""
+		fields = self.record.unpack_from(self._map, self.headerSize + index * self.recordSize)
+		return fields[0], fields[1], fields[2:]
+
+	#________________________________________________
+	def timestamp(self, index):
+		return struct.unpack_from("<d", self._map, self.headerSize + index * self.recordSize)[0]
+
+	#________________________________________________
+	def findTime(self, t):
+		"""Return index of first record with timestamp > t (binary search)"""
+		lo = 0
+		hi = self.count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.timestamp(mid) > t:
+				hi = mid
+			else:
+				lo = mid + 1
+		return lo
+
+class SampleStore(object):
+	"""Writer and reader for a directory of day files sharing one prefix."""
+
+	#________________________________________________
+	def __init__(self, directory, prefix, labels):
+		self.directory = directory
+		self.prefix = prefix
+		self.labels = list(labels)
+		self._file = None
+		self._fileDay = None
+		self._record = None
+		self._numChannels = 0
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	#________________________________________________
+	def _openForAppend(self, timestamp):
+		"""Open (creating if needed) day file for timestamp, trimming any torn tail"""
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+		path = dayFileName(self.directory, self.prefix, timestamp)
+		f = None
+		if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size:
+			f = open(path, 'r+b')
+			magic, version, numChannels, recordSize, headerSize, created = \
+				FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+			if magic != STORE_MAGIC or version != STORE_VERSION:
+				f.close()
+				raise ValueError("%s is not a sample store file" % path)
+
+			size = os.path.getsize(path)
+			if size < headerSize:
+				# Crash while labels were written; file holds no records, so start it again
+				print("*** Rebuilding %s, cut short in its header" % path)
+				f.close()
+				f = None
+			else:
+				# Crash-safe tail check: drop partial record, and a last record
+				#  that does not belong to this day
+				count = (size - headerSize) // recordSize
+				if count:
+					f.seek(headerSize + (count - 1) * recordSize)
+					last = struct.unpack("<d", f.read(8))[0]
+					if dayStart(last) != dayStart(timestamp):
+						count -= 1
+				if headerSize + count * recordSize != size:
+					print("*** Trimming torn record from %s" % path)
+					f.truncate(headerSize + count * recordSize)
+				f.seek(0, 2)
+		if f is None:
+			numChannels = len(self.labels)
+			headerSize = FILE_HEADER.size + LABEL_SIZE * numChannels
+			recordSize = recordStruct(numChannels).size
+			f = open(path, 'w+b')
+			f.write(FILE_HEADER.pack(STORE_MAGIC, STORE_VERSION, numChannels, recordSize, headerSize, time.time()))
+			for label in self.labels:
+				f.write(label.encode('latin-1')[:LABEL_SIZE].ljust(LABEL_SIZE, b"\0"))
+			f.flush()
+
+		self._file = f
+		self._fileDay = dayStart(timestamp)
+		self._numChannels = numChannels
+		self._record = recordStruct(numChannels)
+
+	#________________________________________________
+	def append(self, timestamp, values, valid):
+		"""Append one sample; values beyond file's channel count are dropped"""
+		if self._fileDay != dayStart(timestamp):
+			self._openForAppend(timestamp)
+
+		n = self._numChannels
+		fields = [float(values[i]) if i < len(values) else 0.0 for i in range(n)]
+		self._file.write(self._record.pack(timestamp, valid & ((1 << n) - 1), *fields))
+		self._file.flush()
+
+	#________________________________________________
+	def appendFrame(self, frame):
+		self.append(frame.timestamp, frame.values, frame.valid)
+
+	#________________________________________________
+	def close(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+			self._fileDay = None
+
+	#________________________________________________
+	def dayFiles(self, startTime, endTime):
+		"""Return paths of existing day files covering startTime..endTime"""
+		return dayFiles(self.directory, self.prefix, startTime, endTime)
+
+	#________________________________________________
+	def readRange(self, startTime, endTime):
+		"""Generate (timestamp, valid, values) for samples with startTime < t <= endTime"""
+		for path in self.dayFiles(startTime, endTime):
+			try:
+				storeFile = StoreFile(path)
+			except ValueError as e:
+				# e.g. crash right after creating file; appending rebuilds it
+				print("*** Skipping %s" % e)
+				continue
+			try:
+				index = storeFile.findTime(startTime)
+				while index < storeFile.count:
+					record = storeFile.read(index)
+					if record[0] > endTime:
+						break
+					yield record
+					index += 1
+			finally:
+				storeFile.close()
+
+class StoreTail(object):
+	"""Follows a store's day files from startTime on, returning records as
+	they are appended (by this or another process). Every StoreTail with the
+	same startTime sees the same records in the same order.
+	"""
+
+	#________________________________________________
+	def __init__(self, directory, prefix, startTime):
+		self.directory = directory
+		self.prefix = prefix
+		self.startTime = startTime
+		self.day = dayStart(startTime)
+		self.file = None
+		self.index = 0
+
+	#________________________________________________
+	def poll(self):
+		"""Return list of (timestamp, valid, values) appended since last poll"""
+		records = []
+		while True:
+			if self.file is None:
+				path = dayFileName(self.directory, self.prefix, self.day)
+				if os.path.exists(path):
+					try:
+						self.file = StoreFile(path)
+						self.index = self.file.findTime(self.startTime)
+					except ValueError:
+						pass		# header not written yet; look again next poll
+			if self.file is not None:
+				count = self.file.refresh()
+				while self.index < count:
+					records.append(self.file.read(self.index))
+					self.index += 1
+
+			# Move to next day only once it has begun; today's file may still grow
+			if self.day + DAY_SECONDS > time.time():
+				return records
+			if self.file is not None:
+				self.file.close()
+				self.file = None
+			self.day += DAY_SECONDS
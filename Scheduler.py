@@ -2,74 +2,296 @@
 I/O-based task scheduler for coroutines.
 
 Python Essential Reference, page 460.
-Last touched: 08/18/2017
+Timers added: tasks can Sleep or WakeAt a deadline; mainloop idles in
+select until the nearest deadline or I/O event.
+I/O readiness comes from a pluggable backend: epoll on Linux, else poll,
+else the original select.
+Any number of tasks may wait on one fd (served FIFO), and ReadWait/WriteWait
+take an optional timeout that raises WaitTimeout inside the waiting task.
+The socket wrapper lives in CoSocket.py.
+Optional SchedulerStats records task run times, queue depth, select waits
+and fd waits in log2 histograms; when not enabled it costs one test per step.
+RunInExecutor hands blocking calls to a bounded thread pool (concurrent.futures,
+or a small built-in pool on Python 2 without the futures backport); a
+self-pipe watched by the I/O backend wakes the loop when they finish.
+Event lets any number of tasks wait for a result that one task produces.
+Last touched: 10/18/2026
 """
 
 import select
 import types
 import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+try:
+	import concurrent.futures as futures
+except ImportError:
+	futures = None
+try:
+	import queue
+except ImportError:
+	import Queue as queue
 
-# Socket object wrapper
-class CoSocket(object):
-	def __init__(self,sock):
-		self.sock = sock
-	def close(self):
-		yield self.sock.close()
-	def bind(self,addr):
-		yield self.sock.bind(addr)
-	def listen(self,backlog):
-		yield self.sock.listen(backlog)
-	def connect(self,addr):
-		yield WriteWait(self.sock)
-		yield self.sock.connect(addr)
-	def accept(self):
-		yield ReadWait(self.sock)
-		conn, addr = self.sock.accept()
-		yield CoSocket(conn), addr
-	def send(self,data):
-		while data:
-			evt = yield WriteWait(self.sock)
-			nsent = self.sock.send(data)
-			data = data[nsent:]
-	def recv(self,maxsize):
-		yield ReadWait(self.sock)
-		yield self.sock.recv(maxsize)
+# Raised inside a task whose ReadWait/WriteWait timed out
+class WaitTimeout(Exception):
+	pass
 
 # Object that represents a running task
 class Task(object):
 	def __init__(self,target):
 		self.target	 = target	# a coroutine
 		self.sendval = None		# value to send when resuming
+		self.throwval = None	# exception to raise in coroutine when resuming
 		self.stack	 = []		# call stack	
+		self.name	 = getattr(target,'__name__','task')
+		self.waitid	 = 0		# bumped on every wake; stale timers are ignored
+		self.waiting = None		# (waiting dict, fd) while in an fd wait
+		self.waitstart = 0.0	# when current fd wait began (stats only)
 	def run(self):
-		try:
-			result = self.target.send(self.sendval)
-			if isinstance(result,SystemCall):
-				return result
-			if isinstance(result,types.GeneratorType):
-				self.stack.append(self.target)
+		while True:
+			try:
+				if self.throwval is not None:
+					exc, self.throwval = self.throwval, None
+					result = self.target.throw(exc)
+				else:
+					result = self.target.send(self.sendval)
+				if isinstance(result,SystemCall):
+					return result
+				if isinstance(result,types.GeneratorType):
+					self.stack.append(self.target)
+					self.sendval = None
+					self.target = result
+				else:
+					if not self.stack: return
+					self.sendval = result
+					self.target = self.stack.pop()
+			except StopIteration:
+				if not self.stack: raise
 				self.sendval = None
-				self.target = result
-			else:
-				if not self.stack: return
-				self.sendval = result
 				self.target = self.stack.pop()
-		except StopIteration:
-			if not self.stack: raise
-			self.sendval = None
-			self.target = self.stack.pop()
+			except Exception as e:
+				# Pass exception up call stack to calling coroutine
+				if not self.stack: raise
+				self.target = self.stack.pop()
+				self.throwval = e
+				continue
+			return
 
 # Object that represents a "system call"
 class SystemCall(object):
 	def handle(self,sched,task):
 		pass
 
+# I/O readiness backends. Each keeps its own registration of fd -> events
+#  (EVENT_READ|EVENT_WRITE) and is only told about fds whose waits changed.
+#  wait() returns list of (fd, events) ready within timeout seconds (None = forever).
+EVENT_READ	= 1
+EVENT_WRITE	= 2
+
+# Original select() path; fd sets rebuilt every call, limited to FD_SETSIZE
+class SelectBackend(object):
+	def __init__(self):
+		self.registered = {}
+	def modify(self,fd,events):
+		if events:
+			self.registered[fd] = events
+		else:
+			self.registered.pop(fd, None)
+	def wait(self,timeout):
+		rlist = [fd for fd, events in self.registered.items() if events & EVENT_READ]
+		wlist = [fd for fd, events in self.registered.items() if events & EVENT_WRITE]
+		r,w,e = select.select(rlist, wlist, [], timeout)
+		ready = [(fd, EVENT_READ) for fd in r]
+		ready.extend([(fd, EVENT_WRITE) for fd in w])
+		return ready
+
+# poll()/epoll() share everything but the timeout units and flag names.
+#  Errors and hangups wake both directions; the task sees the error on its next call.
+#  An fd passed again with unchanged events is still re-armed: it may have been
+#  closed and its number reused since, and epoll forgets closed fds by itself.
+class PollBackend(object):
+	def __init__(self):
+		self.registered = {}
+		self.poller = select.poll()
+		self.flags = {EVENT_READ: select.POLLIN, EVENT_WRITE: select.POLLOUT}
+		self.errorflags = select.POLLERR | select.POLLHUP | select.POLLNVAL
+	def modify(self,fd,events):
+		current = self.registered.get(fd, 0)
+		if not events and not current:
+			return
+		mask = 0
+		for event, flag in self.flags.items():
+			if events & event:
+				mask |= flag
+		try:
+			if not events:
+				del self.registered[fd]
+				self.poller.unregister(fd)
+			elif current:
+				self.registered[fd] = events
+				self.poller.modify(fd, mask)
+			else:
+				self.registered[fd] = events
+				self.poller.register(fd, mask)
+		except (IOError, OSError):
+			# fd was closed (and maybe reused) while registered; epoll has
+			#  dropped it (ENOENT on modify), so add it again
+			if events:
+				try:
+					self.poller.register(fd, mask)
+				except (IOError, OSError):
+					self.poller.modify(fd, mask)
+	def pollwait(self,timeout):
+		return self.poller.poll(None if timeout is None else timeout * 1000.0)
+	def wait(self,timeout):
+		ready = []
+		for fd, mask in self.pollwait(timeout):
+			events = 0
+			if mask & self.errorflags:
+				events = EVENT_READ | EVENT_WRITE
+			for event, flag in self.flags.items():
+				if mask & flag:
+					events |= event
+			ready.append((fd, events))
+		return ready
+
+class EpollBackend(PollBackend):
+	def __init__(self):
+		self.registered = {}
+		self.poller = select.epoll()
+		self.flags = {EVENT_READ: select.EPOLLIN, EVENT_WRITE: select.EPOLLOUT}
+		self.errorflags = select.EPOLLERR | select.EPOLLHUP
+	def pollwait(self,timeout):
+		return self.poller.poll(-1 if timeout is None else timeout)
+
+# Best backend available on this platform
+def defaultbackend():
+	if hasattr(select, 'epoll'):
+		return EpollBackend()
+	if hasattr(select, 'poll'):
+		return PollBackend()
+	return SelectBackend()
+
+# Thread pools for RunInExecutor. submit() runs fn(*args) on a pool thread
+#  and then calls done(result, exception) on that thread.
+class FuturesExecutor(object):
+	def __init__(self,workers):
+		self.pool = futures.ThreadPoolExecutor(max_workers=workers)
+	def submit(self,fn,args,done):
+		def finished(future):
+			exception = future.exception()
+			done(None if exception is not None else future.result(), exception)
+		self.pool.submit(fn,*args).add_done_callback(finished)
+
+class ThreadExecutor(object):
+	def __init__(self,workers):
+		self.jobs = queue.Queue()
+		for i in range(workers):
+			worker = threading.Thread(target=self.work, name="executor-%d" % i)
+			worker.daemon = True
+			worker.start()
+	def work(self):
+		while True:
+			fn, args, done = self.jobs.get()
+			try:
+				result = fn(*args)
+			except Exception as e:
+				done(None, e)
+			else:
+				done(result, None)
+	def submit(self,fn,args,done):
+		self.jobs.put((fn, args, done))
+
+# Highest resolution clock available
+clock = getattr(time, 'perf_counter', time.time)
+
+# Histogram with power-of-two buckets: bucket i counts values v*scale in [2**(i-1), 2**i)
+class Histogram(object):
+	def __init__(self,name,unit="us",scale=1e6):
+		self.name	 = name
+		self.unit	 = unit
+		self.scale	 = scale		# multiplier from recorded value to unit
+		self.buckets = [0] * 40
+		self.count	 = 0
+		self.total	 = 0.0
+		self.max	 = 0.0
+	def add(self,value):
+		self.count += 1
+		self.total += value
+		if value > self.max:
+			self.max = value
+		bucket = int(value * self.scale).bit_length()
+		self.buckets[min(bucket, len(self.buckets) - 1)] += 1
+	# Upper bound (in unit) of bucket holding given fraction of samples
+	def percentile(self,fraction):
+		target = fraction * self.count
+		seen = 0
+		for bucket in range(len(self.buckets)):
+			seen += self.buckets[bucket]
+			if seen >= target:
+				return (1 << bucket) - 1
+		return (1 << len(self.buckets)) - 1
+	def report(self):
+		if not self.count:
+			return "%s: no samples\n" % self.name
+		scale = self.scale
+		lines = ["%s: n=%d mean=%.1f%s max=%.1f%s p50<=%d%s p99<=%d%s\n" % (self.name, self.count,
+			self.total / self.count * scale, self.unit, self.max * scale, self.unit,
+			self.percentile(0.5), self.unit, self.percentile(0.99), self.unit)]
+		for bucket in range(len(self.buckets)):
+			if self.buckets[bucket]:
+				lines.append("  <%-10d %d\n" % (1 << bucket, self.buckets[bucket]))
+		return "".join(lines)
+
+# Scheduler instrumentation; pass to Scheduler(stats=SchedulerStats())
+class SchedulerStats(object):
+	def __init__(self):
+		self.started	= time.time()
+		self.tasks		= {}	# task name -> [runs, total seconds, max seconds]
+		self.run		= Histogram("task run step")
+		self.queue		= Histogram("ready queue depth", "", 1)
+		self.select		= Histogram("select wait")
+		self.fdwait		= Histogram("fd wait")
+	def taskrun(self,task,elapsed):
+		self.run.add(elapsed)
+		entry = self.tasks.get(task.name)
+		if entry is None:
+			entry = self.tasks[task.name] = [0, 0.0, 0.0]
+		entry[0] += 1
+		entry[1] += elapsed
+		if elapsed > entry[2]:
+			entry[2] = elapsed
+	def report(self):
+		lines = ["Scheduler stats over %.0f s\n" % (time.time() - self.started)]
+		for name in sorted(self.tasks):
+			runs, total, longest = self.tasks[name]
+			lines.append("task %-20s runs=%d total=%.3fms max=%.3fms\n" % (name, runs, total * 1e3, longest * 1e3))
+		for histogram in (self.run, self.queue, self.select, self.fdwait):
+			lines.append(histogram.report())
+		return "".join(lines)
+
 # Scheduler object
 class Scheduler(object):
-	def __init__(self):
+	def __init__(self,backend=None,stats=None,workers=4):
+		self.backend		= backend if backend is not None else defaultbackend()
+		self.stats			= stats	# SchedulerStats, or None for no instrumentation
+		self.workers		= workers	# RunInExecutor pool size
+		self.executor		= None	# created on first RunInExecutor
+		self.executing		= 0		# RunInExecutor calls not yet resumed
+		self.completed		= collections.deque()	# (task, result, exception) from pool threads
+		self.wakeread		= None	# self-pipe written when a call completes
+		self.wakewrite		= None
+		self.wakepending	= False	# wakeup byte written and not yet read
+		self.wakelock		= threading.Lock()	# guards completed and wakepending
+		self.changed		= set()	# fds whose waits changed since backend was told
 		self.task_queue		= collections.deque()
 		self.read_waiting	= {}
 		self.write_waiting	= {}
+		self.sleeping		= []	# heap of (deadline, order, task, waitid, exception)
+		self.sleeporder		= itertools.count()	# keeps equal deadlines FIFO
 		self.numtasks		= 0
 	
 	# Create new task out of a coroutine
@@ -83,30 +305,172 @@ class Scheduler(object):
 		self.task_queue.append(task)
 	
 	# Have task wait for data on a file descriptor
-	def readwait(self,task,fd):
-		self.read_waiting[fd] = task
+	def readwait(self,task,fd,timeout=None):
+		self.fdwait(self.read_waiting,task,fd,timeout)
 	
 	# Have task wait for writing on a file descriptor
-	def writewait(self,task,fd):
-		self.write_waiting[fd] = task
+	def writewait(self,task,fd,timeout=None):
+		self.fdwait(self.write_waiting,task,fd,timeout)
+	
+	# Queue task behind any others waiting on fd; optionally give up after timeout
+	def fdwait(self,waiting,task,fd,timeout):
+		queue = waiting.get(fd)
+		if queue is None:
+			queue = waiting[fd] = collections.deque()
+			self.changed.add(fd)
+		queue.append(task)
+		task.waiting = (waiting, fd)
+		if self.stats is not None:
+			task.waitstart = clock()
+		if timeout is not None:
+			self.settimer(task, time.time() + timeout, WaitTimeout("timed out after %g s" % timeout))
+	
+	# Wake first task waiting on fd
+	def fdready(self,waiting,fd):
+		queue = waiting[fd]
+		task = queue.popleft()
+		if not queue:
+			del waiting[fd]
+			self.changed.add(fd)
+		task.waiting = None
+		task.waitid += 1
+		if self.stats is not None:
+			self.stats.fdwait.add(clock() - task.waitstart)
+		self.schedule(task)
+	
+	# Take task out of its fd wait queue
+	def fdcancel(self,task):
+		waiting, fd = task.waiting
+		queue = waiting[fd]
+		queue.remove(task)
+		if not queue:
+			del waiting[fd]
+			self.changed.add(fd)
+		task.waiting = None
+		if self.stats is not None:
+			self.stats.fdwait.add(clock() - task.waitstart)
+	
+	# Bring backend registrations up to date; done lazily just before waiting,
+	#  so a task that is woken and waits again on same fd costs at most one
+	#  re-arm (needed in case the fd was closed and reused meanwhile)
+	def updatebackend(self):
+		for fd in self.changed:
+			events = 0
+			if fd in self.read_waiting:
+				events |= EVENT_READ
+			if fd in self.write_waiting:
+				events |= EVENT_WRITE
+			self.backend.modify(fd,events)
+		self.changed.clear()
+	
+	# Run fn(*args) on pool thread; task resumes with its result or exception
+	def runinexecutor(self,task,fn,args):
+		if self.executor is None:
+			if futures is not None:
+				self.executor = FuturesExecutor(self.workers)
+			else:
+				self.executor = ThreadExecutor(self.workers)
+			self.wakeread, self.wakewrite = os.pipe()
+			self.backend.modify(self.wakeread,EVENT_READ)
+		
+		def done(result,exception):
+			# Pool thread: one wakeup byte per batch
+			with self.wakelock:
+				self.completed.append((task, result, exception))
+				if not self.wakepending:
+					self.wakepending = True
+					os.write(self.wakewrite,b"\0")
+		self.executing += 1
+		self.executor.submit(fn,args,done)
+	
+	# Resume tasks whose executor calls have finished
+	def executordone(self):
+		# Byte is read before wakepending is cleared, so a call finishing
+		#  after this either is drained below or writes a fresh byte
+		os.read(self.wakeread,4096)
+		with self.wakelock:
+			self.wakepending = False
+			completed = list(self.completed)
+			self.completed.clear()
+		for task, result, exception in completed:
+			self.executing -= 1
+			task.sendval = result
+			task.throwval = exception
+			self.schedule(task)
+	
+	# Wake task at deadline (epoch seconds), raising exception in it if given;
+	#  ignored if task has been woken by something else in the meantime
+	def settimer(self,task,deadline,exception=None):
+		heapq.heappush(self.sleeping, (deadline, next(self.sleeporder), task, task.waitid, exception))
+	
+	# Have task sleep until deadline (epoch seconds)
+	def sleepuntil(self,task,deadline):
+		self.settimer(task,deadline)
+	
+	# Wake tasks whose deadline has passed
+	def expiretimers(self):
+		now = time.time()
+		while self.sleeping and self.sleeping[0][0] <= now:
+			deadline, order, task, waitid, exception = heapq.heappop(self.sleeping)
+			if waitid != task.waitid:
+				continue
+			task.waitid += 1
+			if task.waiting is not None:
+				self.fdcancel(task)
+			task.throwval = exception
+			self.schedule(task)
+	
+	# Seconds to block waiting for events: 0 if tasks are ready, otherwise
+	#  until nearest deadline, but no longer than timeout
+	def waittime(self,timeout):
+		if self.task_queue:
+			return 0
+		if self.sleeping:
+			untilDeadline = max(0, self.sleeping[0][0] - time.time())
+			if timeout is None or untilDeadline < timeout:
+				return untilDeadline
+		return timeout
 	
 	# Main schedule loop
 	def mainloop(self,count=-1,timeout=None):
+		stats = self.stats
 		while self.numtasks:
 			# Check for I/O events to handle
-			if self.read_waiting or self.write_waiting:
-				wait = 0 if self.task_queue else timeout
-				r,w,e = select.select(self.read_waiting, self.write_waiting, [], wait)
-				for fileno in r:
-					self.schedule(self.read_waiting.pop(fileno))
-				for fileno in w:
-					self.schedule(self.write_waiting.pop(fileno))
+			wait = self.waittime(timeout)
+			if stats is not None:
+				stats.queue.add(len(self.task_queue))
+				waitstart = clock()
+			if self.read_waiting or self.write_waiting or self.executing:
+				self.updatebackend()
+				for fileno, events in self.backend.wait(wait):
+					if fileno == self.wakeread:
+						self.executordone()
+						continue
+					if events & EVENT_READ and fileno in self.read_waiting:
+						self.fdready(self.read_waiting,fileno)
+					if events & EVENT_WRITE and fileno in self.write_waiting:
+						self.fdready(self.write_waiting,fileno)
+			elif wait:
+				time.sleep(wait)
+			elif wait is None and not self.task_queue and not self.sleeping:
+				return		# nothing can ever wake remaining tasks
+			if stats is not None:
+				stats.select.add(clock() - waitstart)
+			
+			self.expiretimers()
 			
 			# Run all tasks on queue that are ready to run
 			while self.task_queue:
 				task = self.task_queue.popleft()
 				try:
-					result = task.run()
+					if stats is None:
+						result = task.run()
+					else:
+						runstart = clock()
+						try:
+							result = task.run()
+						finally:
+							stats.taskrun(task, clock() - runstart)
 					if isinstance(result,SystemCall):
 						result.handle(self,task)
 					else:
@@ -122,18 +486,39 @@ class Scheduler(object):
 
 # Implementation of different system calls
 class ReadWait(SystemCall):
-	def __init__(self,f):
+	def __init__(self,f,timeout=None):
 		self.f = f
+		self.timeout = timeout
 	def handle(self,sched,task):
 		fileno = self.f.fileno()
-		sched.readwait(task,fileno)
+		sched.readwait(task,fileno,self.timeout)
 
 class WriteWait(SystemCall):
-	def __init__(self,f):
+	def __init__(self,f,timeout=None):
 		self.f = f
+		self.timeout = timeout
 	def handle(self,sched,task):
 		fileno = self.f.fileno()
-		sched.writewait(task,fileno)
+		sched.writewait(task,fileno,self.timeout)
+
+class Sleep(SystemCall):
+	def __init__(self,seconds):
+		self.seconds = seconds
+	def handle(self,sched,task):
+		sched.sleepuntil(task,time.time() + self.seconds)
+
+class WakeAt(SystemCall):
+	def __init__(self,deadline):
+		self.deadline = deadline
+	def handle(self,sched,task):
+		sched.sleepuntil(task,self.deadline)
+
+class RunInExecutor(SystemCall):
+	def __init__(self,fn,*args):
+		self.fn = fn
+		self.args = args
+	def handle(self,sched,task):
+		sched.runinexecutor(task,self.fn,self.args)
 
 class NewTask(SystemCall):
 	def __init__(self,target):
@@ -141,3 +526,36 @@ class NewTask(SystemCall):
 	def handle(self,sched,task):
 		sched.new(self.target)
 		sched.schedule(task)
+
+# One-shot result that tasks can wait for: yield event.wait() returns value
+#  passed to set(), or raises exception passed to set(). Waiting after set()
+#  returns at once.
+class Event(object):
+	def __init__(self):
+		self.waiters = []		# (scheduler, task) to wake on set()
+		self.isset = False
+		self.value = None
+		self.exception = None
+	def wait(self):
+		return WaitEvent(self)
+	def set(self,value=None,exception=None):
+		self.isset = True
+		self.value = value
+		self.exception = exception
+		waiters, self.waiters = self.waiters, []
+		for sched, task in waiters:
+			self.resume(sched,task)
+	def resume(self,sched,task):
+		task.waitid += 1
+		task.sendval = self.value
+		task.throwval = self.exception
+		sched.schedule(task)
+
+class WaitEvent(SystemCall):
+	def __init__(self,event):
+		self.event = event
+	def handle(self,sched,task):
+		if self.event.isset:
+			self.event.resume(sched,task)
+		else:
+			self.event.waiters.append((sched,task))
@@ -0,0 +1,344 @@
+"""
+Benchmarks for the coroutine Scheduler and CoSocket server path.
+
+Runs on loopback, no hardware needed. Measures task switches through
+Task.run's nested-generator trampoline (bare and with SchedulerStats),
+accept rate, request/response round trips against a TemperatureCollector-
+style query server, and large payload send throughput. Each socket benchmark is run with every available
+I/O backend and, on Python 3, with the same generator servers run on
+asyncio through AsyncioScheduler and with an asyncio equivalent. Clients run in a
+separate process so they do not share the server's interpreter lock.
+
+Usage: python SchedulerBenchmark.py [--output file.json] [--quick]
+Results are written as JSON so runs can be compared between versions.
+Last touched: 10/18/2026
+"""
+
+import argparse
+import array
+import json
+import multiprocessing
+import platform
+import select
+import socket
+import time
+from Scheduler import *
+from CoSocket import CoSocket, FRAME_HEADER
+import SampleHistory
+
+try:
+	import asyncio
+	from AsyncioScheduler import AsyncioScheduler
+except ImportError:
+	asyncio = None
+
+QUERY = b"GET since=0 sensors=0,3\n"
+
+#________________________________________________
+def backends():
+	"""Return list of (name, backend class) available on this platform"""
+	result = [("select", SelectBackend)]
+	if hasattr(select, 'poll'):
+		result.append(("poll", PollBackend))
+	if hasattr(select, 'epoll'):
+		result.append(("epoll", EpollBackend))
+	return result
+
+#________________________________________________
+def listener():
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind(("127.0.0.1", 0))
+	sock.listen(128)
+	return sock
+
+# Stand-in for TemperatureSensors.ReadingFrame, which needs the I2C driver
+class Frame(object):
+	def __init__(self, values, valid, timestamp):
+		self.values = values
+		self.valid = valid
+		self.timestamp = timestamp
+		self.held = valid
+
+#________________________________________________
+def sampleHistory(samples):
+	"""Return SampleHistory filled with synthetic readings"""
+	history = SampleHistory.SampleHistory(7, samples)
+	for i in range(samples):
+		values = array.array('d', [60.0 + (i + sensor) % 20 for sensor in range(7)])
+		history.append(Frame(values, 0x7F, 1.5e9 + 10 * i))
+	return history
+
+# ---------------------------------------------------------------- clients
+# Run in child process; each puts its measurement on results queue
+
+#________________________________________________
+def acceptClient(port, count, results):
+	start = time.time()
+	for i in range(count):
+		sock = socket.create_connection(("127.0.0.1", port))
+		sock.recv(1)		# server closes at once
+		sock.close()
+	results.put(count / (time.time() - start))
+
+#________________________________________________
+def requestClient(port, connections, requests, results):
+	socks = [socket.create_connection(("127.0.0.1", port)) for i in range(connections)]
+	start = time.time()
+	for i in range(requests):
+		for sock in socks:
+			sock.sendall(QUERY)
+		for sock in socks:
+			length = FRAME_HEADER.unpack(readExactly(sock, FRAME_HEADER.size))[0]
+			readExactly(sock, length)
+	elapsed = time.time() - start
+	for sock in socks:
+		sock.close()
+	results.put(connections * requests / elapsed)
+
+#________________________________________________
+def throughputClient(port, size, results):
+	sock = socket.create_connection(("127.0.0.1", port))
+	start = time.time()
+	received = 0
+	buf = bytearray(1 << 16)
+	while True:
+		n = sock.recv_into(buf)
+		if not n:
+			break
+		received += n
+	elapsed = time.time() - start
+	sock.close()
+	results.put(received / elapsed / 1e6)
+
+#________________________________________________
+def readExactly(sock, n):
+	data = b""
+	while len(data) < n:
+		chunk = sock.recv(n - len(data))
+		if not chunk:
+			raise EOFError("server closed connection")
+		data += chunk
+	return data
+
+# ---------------------------------------------------------------- Scheduler servers
+
+#________________________________________________
+def acceptServer(listen):
+	while True:
+		client, addr = yield listen.accept()
+		yield client.close()
+
+#________________________________________________
+def queryServer(listen, history):
+	while True:
+		client, addr = yield listen.accept()
+		yield NewTask(queryHandler(client, history))
+
+#________________________________________________
+def queryHandler(client, history):
+	# Same work as collector's query handler, with length-prefixed replies
+	#  so one connection can carry many requests
+	while True:
+		request = yield client.readline()
+		if not request:
+			break
+		first, n = history.select(0, None)
+		reply = history.rowsString(first, n, [0, 3]).encode('latin-1')
+		yield client.sendall([FRAME_HEADER.pack(len(reply)), reply])
+	yield client.close()
+
+#________________________________________________
+def payloadServer(listen, payload):
+	while True:
+		client, addr = yield listen.accept()
+		yield NewTask(payloadHandler(client, payload))
+
+#________________________________________________
+def payloadHandler(client, payload):
+	yield client.send(payload)
+	yield client.close()
+
+#________________________________________________
+def runScheduler(backend, server, client, clientArgs):
+	"""Serve with one Scheduler task until client process reports its result"""
+	listen = listener()
+	results = multiprocessing.Queue()
+	scheduler = Scheduler(backend())
+	scheduler.new(server(CoSocket(listen)))
+	process = multiprocessing.Process(target=client, args=(listen.getsockname()[1],) + clientArgs + (results,))
+	process.start()
+	while process.is_alive() and results.empty():
+		scheduler.mainloop(count=1, timeout=0.05)
+	process.join()
+	listen.close()
+	return results.get()
+
+#________________________________________________
+def runAdapter(server, client, clientArgs):
+	"""As runScheduler, with generator tasks stepped by an asyncio loop"""
+	listen = listener()
+	results = multiprocessing.Queue()
+	scheduler = AsyncioScheduler()
+	scheduler.new(server(CoSocket(listen)))
+	process = multiprocessing.Process(target=client, args=(listen.getsockname()[1],) + clientArgs + (results,))
+	process.start()
+	while process.is_alive() and results.empty():
+		scheduler.loop.run_until_complete(asyncio.sleep(0.05))
+	process.join()
+	listen.close()
+	scheduler.loop.close()
+	return results.get()
+
+# ---------------------------------------------------------------- asyncio servers
+# Protocol classes need no async syntax, so module still compiles on Python 2
+
+if asyncio is not None:
+	class AcceptProtocol(asyncio.Protocol):
+		def connection_made(self, transport):
+			transport.close()
+
+	class QueryProtocol(asyncio.Protocol):
+		def __init__(self, history):
+			self.history = history
+			self.buffer = b""
+		def connection_made(self, transport):
+			self.transport = transport
+		def data_received(self, data):
+			self.buffer += data
+			while b"\n" in self.buffer:
+				request, self.buffer = self.buffer.split(b"\n", 1)
+				first, n = self.history.select(0, None)
+				reply = self.history.rowsString(first, n, [0, 3]).encode('latin-1')
+				self.transport.writelines([FRAME_HEADER.pack(len(reply)), reply])
+
+	class PayloadProtocol(asyncio.Protocol):
+		def __init__(self, payload):
+			self.payload = payload
+		def connection_made(self, transport):
+			transport.write(memoryview(self.payload).cast('B'))
+			transport.close()
+
+#________________________________________________
+def runAsyncio(protocolFactory, client, clientArgs):
+	loop = asyncio.new_event_loop()
+	listen = listener()
+	server = loop.run_until_complete(loop.create_server(protocolFactory, sock=listen))
+	results = multiprocessing.Queue()
+	process = multiprocessing.Process(target=client, args=(listen.getsockname()[1],) + clientArgs + (results,))
+	process.start()
+	while process.is_alive() and results.empty():
+		loop.run_until_complete(asyncio.sleep(0.05))
+	process.join()
+	server.close()
+	loop.run_until_complete(server.wait_closed())
+	loop.close()
+	return results.get()
+
+# ---------------------------------------------------------------- task switches
+
+#________________________________________________
+def leaf():
+	yield None		# plain value: trampoline returns it to caller
+
+#________________________________________________
+def nested(depth):
+	if depth:
+		yield nested(depth - 1)
+	else:
+		yield leaf()
+
+#________________________________________________
+def switcher(count, depth):
+	for i in range(count):
+		yield nested(depth)
+
+#________________________________________________
+def taskSwitches(count, depth, stats=None):
+	"""Return Task.run steps per second for tasks calling nested generators.
+	Pass a SchedulerStats to time the instrumented path instead.
+	"""
+	scheduler = Scheduler(SelectBackend(), stats=stats)
+	tasks = 10
+	for i in range(tasks):
+		scheduler.new(switcher(count // tasks, depth))
+	start = time.time()
+	scheduler.mainloop()
+	elapsed = time.time() - start
+	# Each switcher iteration enters and leaves depth + 2 generators, one step each
+	return (count // tasks) * tasks * 2 * (depth + 2) / elapsed
+
+#________________________________________________
+def asyncioCallbacks(count):
+	"""Return asyncio call_soon dispatches per second, for comparison"""
+	loop = asyncio.new_event_loop()
+	remaining = [count]
+	def step():
+		remaining[0] -= 1
+		if remaining[0]:
+			loop.call_soon(step)
+		else:
+			loop.stop()
+	loop.call_soon(step)
+	start = time.time()
+	loop.run_forever()
+	loop.close()
+	return count / (time.time() - start)
+
+#________________________________________________
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark Scheduler and CoSocket on loopback")
+	parser.add_argument("--output", default="SchedulerBenchmark.json", help="JSON results file")
+	parser.add_argument("--quick", action="store_true", help="smaller runs, for a smoke test")
+	args = parser.parse_args()
+
+	scale = 10 if args.quick else 1
+	switchCount = 200000 // scale
+	acceptCount = 2000 // scale
+	connections, requests = 10, 500 // scale
+	payloadSize = (32 << 20) // scale
+	history = sampleHistory(100)
+	payload = array.array('B', [0]) * payloadSize
+
+	results = {}
+	def record(benchmark, variant, value, unit):
+		results.setdefault(benchmark, {"unit": unit})[variant] = round(value, 1)
+		print("%-22s %-10s %12.1f %s" % (benchmark, variant, value, unit))
+
+	record("task_switches", "Task.run", taskSwitches(switchCount, 3), "steps/s")
+	record("task_switches", "stats", taskSwitches(switchCount, 3, SchedulerStats()), "steps/s")
+	if asyncio is not None:
+		record("task_switches", "asyncio", asyncioCallbacks(switchCount), "callbacks/s")
+
+	for name, backend in backends():
+		record("accept", name, runScheduler(backend, acceptServer, acceptClient, (acceptCount,)), "conn/s")
+		record("request_response", name, runScheduler(backend, lambda listen: queryServer(listen, history),
+			requestClient, (connections, requests)), "req/s")
+		record("send_throughput", name, runScheduler(backend, lambda listen: payloadServer(listen, payload),
+			throughputClient, (payloadSize,)), "MB/s")
+	if asyncio is not None:
+		record("accept", "adapter", runAdapter(acceptServer, acceptClient, (acceptCount,)), "conn/s")
+		record("request_response", "adapter", runAdapter(lambda listen: queryServer(listen, history),
+			requestClient, (connections, requests)), "req/s")
+		record("send_throughput", "adapter", runAdapter(lambda listen: payloadServer(listen, payload),
+			throughputClient, (payloadSize,)), "MB/s")
+		record("accept", "asyncio", runAsyncio(AcceptProtocol, acceptClient, (acceptCount,)), "conn/s")
+		record("request_response", "asyncio", runAsyncio(lambda: QueryProtocol(history),
+			requestClient, (connections, requests)), "req/s")
+		record("send_throughput", "asyncio", runAsyncio(lambda: PayloadProtocol(payload),
+			throughputClient, (payloadSize,)), "MB/s")
+
+	report = {
+		"timestamp": time.time(),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"quick": args.quick,
+		"results": results,
+	}
+	with open(args.output, "w") as f:
+		json.dump(report, f, indent=2, sort_keys=True)
+	print("Results written to %s" % args.output)
+
+#________________________________________________
+if __name__ == '__main__':
+	main()
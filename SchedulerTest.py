@@ -0,0 +1,84 @@
+"""
+Regression tests for Scheduler.
+
+Run with: python -m unittest SchedulerTest
+Last touched: 10/18/2026
+"""
+
+import select
+import socket
+import time
+import unittest
+from Scheduler import *
+
+#________________________________________________
+def backends():
+	result = [SelectBackend]
+	if hasattr(select, 'poll'):
+		result.append(PollBackend)
+	if hasattr(select, 'epoll'):
+		result.append(EpollBackend)
+	return result
+
+class FdReuseTest(unittest.TestCase):
+	"""A closed fd whose number is reused before the backend is next
+	updated must still be watched for its new socket."""
+
+	#________________________________________________
+	def reuse(self, backend):
+		woken = []
+		a, b = socket.socketpair()
+
+		def waiter():
+			b.send(b"x")
+			yield ReadWait(a)
+			a.recv(1)
+			fd = a.fileno()
+			a.close()
+			# Same step as close: backend is only told after this wait
+			c, d = socket.socketpair()
+			self.assertEqual(c.fileno(), fd)
+			d.send(b"y")
+			yield ReadWait(c, 2.0)
+			woken.append(c.recv(1))
+			for sock in (b, c, d):
+				sock.close()
+
+		scheduler = Scheduler(backend())
+		scheduler.new(waiter())
+		start = time.time()
+		scheduler.mainloop()
+		self.assertEqual(woken, [b"y"])
+		self.assertTrue(time.time() - start < 1.0)
+
+	#________________________________________________
+	def test_reuse(self):
+		for backend in backends():
+			self.reuse(backend)
+
+class ExecutorTest(unittest.TestCase):
+	"""Every RunInExecutor call resumes its task, however calls and
+	wakeups interleave."""
+
+	#________________________________________________
+	def test_completions(self):
+		results = []
+
+		def caller(n):
+			for i in range(200):
+				value = yield RunInExecutor(pow, n, 2)
+				results.append(value)
+
+		scheduler = Scheduler(workers=4)
+		for n in range(10):
+			scheduler.new(caller(n))
+		# Step loop with a timeout: a stranded completion would otherwise hang it
+		scheduler.mainloop(count=1)
+		start = time.time()
+		while scheduler.executing or scheduler.task_queue:
+			scheduler.mainloop(count=1, timeout=0.5)
+			self.assertTrue(time.time() - start < 20, "executor calls not all resumed")
+		self.assertEqual(sorted(results), sorted([n * n for n in range(10)] * 200))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,147 @@
+"""
+Registry of 1-wire sensor ROM codes and labels, persisted to a text file.
+
+Sensors are found with DS2482 Search ROM; search is only re-run when one
+sensor's repeated presence or CRC problems suggest the bus topology has
+changed, and less often for a sensor each time a search fails to bring it back.
+Last touched: 10/18/2026
+"""
+
+import os
+
+DEFAULT_REGISTRY_FILE	= "SensorRegistry.txt"
+ANOMALY_THRESHOLD		= 3		# consecutive bad reads of one sensor before re-running search
+MAX_ANOMALY_THRESHOLD	= 192	# threshold doubles up to this while searches leave sensor bad
+
+#________________________________________________
+def romToStr(rom):
+	"""Format ROM code as in sensor comments, CRC byte first: 5F000003AA865228"""
+	return "".join(["%02X" % b for b in reversed(rom)])
+
+#________________________________________________
+def strToRom(romStr):
+	"""Parse ROM string from romToStr back into list of 8 bytes, family code first"""
+	romStr = romStr.strip()
+	if romStr.lower().startswith("0x"):
+		romStr = romStr[2:]
+	rom = [int(romStr[i:i+2], 16) for i in range(0, 16, 2)]
+	rom.reverse()
+	return rom
+
+class SensorRegistry(object):
+	"""Ordered list of (ROM code, label) entries; order gives sensor index."""
+
+	#________________________________________________
+	def __init__(self, path=DEFAULT_REGISTRY_FILE):
+		self.path = path
+		self.roms = []
+		self.labels = []
+		self.anomalies = []		# consecutive bad reads, by sensor index
+		self.thresholds = []	# bad reads before sensor triggers a search, by sensor index
+
+	#________________________________________________
+	def load(self):
+		"""Read registry file; returns False if file does not exist"""
+		if not os.path.exists(self.path):
+			return False
+
+		self.roms = []
+		self.labels = []
+		f = open(self.path, 'r')
+		for line in f:
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			fields = line.split('\t', 1)
+			self.roms.append(strToRom(fields[0]))
+			if len(fields) > 1:
+				self.labels.append(fields[1].strip())
+			else:
+				self.labels.append("Sensor %d" % (len(self.roms) - 1))
+		f.close()
+		return True
+
+	#________________________________________________
+	def save(self):
+		"""Write registry file, replacing it atomically"""
+		tmpPath = self.path + ".tmp"
+		f = open(tmpPath, 'w')
+		f.write("# ROM code (0x omitted)\tLabel\n")
+		for rom, label in zip(self.roms, self.labels):
+			f.write("%s\t%s\n" % (romToStr(rom), label))
+		f.close()
+		os.rename(tmpPath, self.path)
+
+	#________________________________________________
+	def romCodes(self):
+		"""Return list of ROM codes in sensor index order"""
+		return self.roms
+
+	#________________________________________________
+	def discover(self, controller):
+		"""Run Search ROM on DS2482 controller and merge results into registry.
+		Known sensors keep their index and label; new sensors are appended.
+		Returns list of indices for registered sensors that did not respond.
+		"""
+		found = controller.DS2482_owSearch()
+		added = False
+		for rom in found:
+			if rom not in self.roms:
+				self.roms.append(rom)
+				self.labels.append("Sensor %d" % (len(self.roms) - 1))
+				print("+++ New 1-wire sensor %d: 0x%s" % (len(self.roms) - 1, romToStr(rom)))
+				added = True
+
+		missing = [i for i in range(len(self.roms)) if self.roms[i] not in found]
+		for i in missing:
+			print("*** 1-wire sensor %d (%s) not found" % (i, self.labels[i]))
+
+		# Missing sensors stay registered, so file only changes when one is added
+		if added:
+			self.save()
+		self.growCounts()
+		self.anomalies = [0] * len(self.roms)
+		return missing
+
+	#________________________________________________
+	def loadOrDiscover(self, controller):
+		"""Load registry file, only searching the bus if there is no file yet"""
+		if not self.load():
+			self.discover(controller)
+		return self.roms
+
+	#________________________________________________
+	def growCounts(self):
+		while len(self.thresholds) < len(self.roms):
+			self.anomalies.append(0)
+			self.thresholds.append(ANOMALY_THRESHOLD)
+
+	#________________________________________________
+	def noteSample(self, controller, sensors, valid):
+		"""Record outcome of reading sensors (list of indices): bit i of valid is
+		set if sensors[i] read cleanly, clear for missing presence or bad CRC.
+		Re-runs discovery once a sensor has had its threshold of consecutive bad
+		reads. Returns True if discovery ran.
+		"""
+		self.growCounts()
+		triggered = []
+		for i in range(len(sensors)):
+			sensor = sensors[i]
+			if (valid >> i) & 1:
+				self.anomalies[sensor] = 0
+				self.thresholds[sensor] = ANOMALY_THRESHOLD
+			else:
+				self.anomalies[sensor] += 1
+				if self.anomalies[sensor] >= self.thresholds[sensor]:
+					triggered.append(sensor)
+		if not triggered:
+			return False
+
+		print("*** Repeated 1-wire anomalies; re-running sensor search")
+		missing = self.discover(controller)
+
+		# Searching again soon will not fix a sensor this search could not find
+		#  or that is still failing, so wait twice as long before the next one
+		for sensor in set(triggered + missing):
+			self.thresholds[sensor] = min(2 * self.thresholds[sensor], MAX_ANOMALY_THRESHOLD)
+		return True
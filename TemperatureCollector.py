@@ -2,167 +2,62 @@
 Collects and stores temperature data; sends data to Mac on command.
 
 Works with XCode BeagleBoneClient2.
-Last touched: 08/18/2017
+Last touched: 10/18/2026
 """
 
 from socket import *
 import array
+import os
 import time
+import traceback
 import DS2482
+import DS18B20
+import TemperatureSensors
+import SampleHistory
+import SampleStore
 from Scheduler import *
+from CoSocket import CoSocket
 
-# Temperature sensor codes and locations
-# Sensor 0 (0x5F000003AA865228) - breadboard, basement ambient temperature
-# Sensor 1 (0xB1000003AA618A28) - main house radiator return temperature
-# Sensor 2 (0xD5000003AA892E28) - library radiator return temperature
-# Sensor 3 (0xFA000003AAABC228) - radiator supply temperature
-# Sensor 4 (0x77000003AA72EB28) - H20 heater input temperature
-# Sensor 5 (0x16000003AAAA6E28) - H20 heater output temperature
-# Sensor 6 (0xBC0000043EFFC128) - Outside temperature
-ROM_CODE = [[0x28,0x52,0x86,0xAA,0x03,0x00,0x00,0x5F], 
-			[0x28,0x8A,0x61,0xAA,0x03,0x00,0x00,0xB1], 
-			[0x28,0x2E,0x89,0xAA,0x03,0x00,0x00,0xD5], 
-			[0x28,0xC2,0xAB,0xAA,0x03,0x00,0x00,0xFA], 
-			[0x28,0x6E,0xAA,0xAA,0x03,0x00,0x00,0x16], 
-			[0x28,0xEB,0x72,0xAA,0x03,0x00,0x00,0x77], 
-			[0x28,0xC1,0xFF,0x3E,0x04,0x00,0x00,0xBC]]	
-
-CRC_TABLE = [0, 94, 188, 226, 97, 63, 221, 131, 194, 156, 126, 32, 163, 253, 31, 65,
-			 157, 195, 33, 127, 252, 162, 64, 30, 95, 1, 227, 189, 62, 96, 130, 220,
-			 35, 125, 159, 193, 66, 28, 254, 160, 225, 191, 93, 3, 128, 222, 60, 98,
-			 190, 224, 2, 92, 223, 129, 99, 61, 124, 34, 192, 158, 29, 67, 161, 255,
-			 70, 24, 250, 164, 39, 121, 155, 197, 132, 218, 56, 102, 229, 187, 89, 7,
-			 219, 133, 103, 57, 186, 228, 6, 88, 25, 71, 165, 251, 120, 38, 196, 154,
-			 101, 59, 217, 135, 4, 90, 184, 230, 167, 249, 27, 69, 198, 152, 122, 36,
-			 248, 166, 68, 26, 153, 199, 37, 123, 58, 100, 134, 216, 91, 5, 231, 185,
-			 140, 210, 48, 110, 237, 179, 81, 15, 78, 16, 242, 172, 47, 113, 147, 205,
-			 17, 79, 173, 243, 112, 46, 204, 146, 211, 141, 111, 49, 178, 236, 14, 80,
-			 175, 241, 19, 77, 206, 144, 114, 44, 109, 51, 209, 143, 12, 82, 176, 238,
-			 50, 108, 142, 208, 83, 13, 239, 177, 240, 174, 76, 18, 145, 207, 45, 115,
-			 202, 148, 118, 40, 171, 245, 23, 73, 8, 86, 180, 234, 105, 55, 213, 139,
-			 87, 9, 235, 181, 54, 104, 138, 212, 149, 203, 41, 119, 244, 170, 72, 22,
-			 233, 183, 85, 11, 136, 214, 52, 106, 43, 117, 151, 201, 74, 20, 246, 168,
-			 116, 42, 200, 150, 21, 75, 169, 247, 182, 232, 10, 84, 215, 137, 107, 53]
-
-SAMPLE_PERIOD = 10		# seconds between temperature samples
+# Per-sensor sample period (seconds) and resolution (bits), in registry order
+# Radiator supply/returns swing quickly during boiler cycles; ambient and outside change slowly
+SENSOR_RATES = [(60, 12),		# 0 - basement ambient
+				(5,  10),		# 1 - main house radiator return
+				(5,  10),		# 2 - library radiator return
+				(5,  10),		# 3 - radiator supply
+				(10, 11),		# 4 - H20 heater input
+				(10, 11),		# 5 - H20 heater output
+				(60, 12)]		# 6 - outside
+SAMPLE_PERIOD = 10		# seconds between samples for sensors not in SENSOR_RATES
 
-#________________________________________________
-def GetTemperatureData():
-	# Initiate temperature conversion for all sensors
-	# 	Send 1-Wire Reset
-	# 	Send Skip ROM command (address all 1-Wire devices)
-	# 	Send Convert T command
-	# 	Start temperature conversion timer
-	
-	# All DS18B20 transactons start with initialization (reset OW bus)
-	temperatureController.DS2482_owReset()
-	
-	# Send DS18B20 Skip ROM command
-	temperatureController.DS2482_owWriteByte(0xCC)		# DS18B20 Skip ROM
-	
-	# Send DS18B20 Convert T command
-	temperatureController.DS2482_owWriteByte(0x44)		# DS18B20 Convert T
-	
-	# Capture and display conversion time
-	timestr = time.ctime(time.time())
-	print "---------- [%d] Temperature conversion started: %s ----------" % (numTempSamples+1,timestr)
-	
-	# Wait for temperature conversion (750 ms for 12 bits)
-	time.sleep(0.8)
-	
-	# Individually read temperature from each connected sensor
-	# 	Send 1-Wire Reset
-	# 	Send Match ROM command
-	# 	Send Read Scratchpad command
-	# 	Repeat 9 times
-	# 	Repeat 8 times
-	# 	Send 1-Wire Read Byte command
-	# 	Set DS2482 read pointer to Data Register
-	# 	Read byte from DS2482
-	# 	Convert data to temperature
-	
-	ambTempF		= -999
-	mainRadTempF	= -999
-	libRadTempF		= -999
-	radSupTempF		= -999
-	h2oInTempF		= -999
-	h2oOutTempF		= -999
-	outTempF		= -999
-	for sensor in range(7):
-		# All DS18B20 transactons start with initialization (reset OW bus)
-		temperatureController.DS2482_owReset()
-		
-		# Send DS18B20 Match ROM command
-		temperatureController.DS2482_owWriteByte(0x55)		# DS18B20 Match ROM
-		
-		# Send 8 bytes of ROM code
-		for romByte in range(8):
-			temperatureController.DS2482_owWriteByte(ROM_CODE[sensor][romByte])
-		
-		# Send DS18B20 Read Scratchpad command
-		temperatureController.DS2482_owWriteByte(0xBE)		# DS18B20 Read Scratchpad
-		
-		crc8 = 0
-		scratchPad = array.array('B',[])
-		# Read 9 bytes of scratchpad
-		for i in range(9):
-			temperatureController.DS2482_owReadByte()
-			
-			# Set read pointer
-			temperatureController.DS2482_setReadPointer(DS2482.DS2482_READ_DATA_REG)
-			
-			# Read byte from DS2482
-			scratchPad.append(temperatureController._device.readRaw8())		
-			crc8 = CRC_TABLE[crc8 ^ scratchPad[i]]
-		
-		if crc8 == 0:
-			# Convert scratchpad bytes 0 (LSB) & 1 (MSB) to temperature
-			temperatureDegC = (scratchPad[0] / 16.0) + (scratchPad[1] & 0x07) * 16.0;
-			if scratchPad[1] & 0x08:		# temperature <0 deg C
-				temperatureDegC = temperatureDegC - 128.0
-			
-			temperatureDegF = 9.0 / 5.0 * temperatureDegC + 32.0
-			if sensor == 0:
-				ambTempF = temperatureDegF
-			
-			elif sensor == 1:
-				mainRadTempF = temperatureDegF
-			
-			elif sensor == 2:
-				libRadTempF = temperatureDegF
-			
-			elif sensor == 3:
-				radSupTempF = temperatureDegF
-			
-			elif sensor == 4:
-				h2oInTempF = temperatureDegF
-			
-			elif sensor == 5:
-				h2oOutTempF = temperatureDegF
-			
-			elif sensor == 6:
-				outTempF = temperatureDegF
-			
-			else:
-				print "*** Need to add some code!!!"
-					
-		else:
-			print "*** scratchPad data checksum BAD for sensor %d" % (sensor)
-			
-	print "Basement ambient\t\t= %0.1f deg F" % (ambTempF)
-	print "Outside\t\t\t\t= %0.1f deg F" % (outTempF)			
-	print "Radiator supply\t\t\t= %0.1f deg F" % (radSupTempF)
-	print " Main house radiator return\t= %0.1f deg F" % (mainRadTempF)
-	print " Library radiator return\t= %0.1f deg F" % (libRadTempF)
-	print "H20 heater input\t\t= %0.1f deg F" % (h2oInTempF)
-	print "H20 heater output\t\t= %0.1f deg F" % (h2oOutTempF)
-	
-	return (ambTempF,mainRadTempF,libRadTempF,radSupTempF,h2oInTempF,h2oOutTempF,outTempF)
+HISTORY_RETENTION = 2 * 24 * 3600		# seconds of samples kept for clients
+STORE_DIRECTORY = "SampleData"			# day files of every sample, kept indefinitely
+
+LEGACY_PORT = 8888		# full download for BeagleBoneClient2
+QUERY_PORT  = 8889		# incremental queries
+STATS_PORT  = 8890		# scheduler statistics report, on connect
+
+CLIENT_TIMEOUT = 30			# seconds a client may stall a read or write before being dropped
+MAX_QUERY_CLIENTS = 64		# connections served at once; more are refused
+
+# Query server processes. 0 serves queries from this process's history;
+#  N > 0 forks N workers sharing QUERY_PORT via SO_REUSEPORT, each answering
+#  from its own replica of history read from the on-disk store
+QUERY_WORKERS = 0
+WORKER_CHECK = 5		# seconds between checks for query workers that have exited
+
+# Column order in BeagleBoneClient2 download: ambient, outside, main rad, lib rad,
+#  rad supply, H2O in, H2O out
+LEGACY_COLUMN_ORDER = [0, 6, 1, 2, 3, 4, 5]
+
+activeQueries = [0]		# query handlers running; list so coroutines can update it
+storeTail = None		# in a query worker, source of new samples for history
+workerPids = []			# in parent, pids of running query workers
 
 #________________________________________________
 # Asynchronous server based on coroutines (pg 468)
+# Sends samples collected since last download; history itself is left intact
 def server(port):
-	global numTempSamples, timeStr, ambTempStr, outTempStr, mainRadTempStr, libRadTempStr, radSupTempStr, h2oInTempStr, h2oOutTempStr
+	legacySeq = 0		# sequence number of first sample not yet downloaded
 	
 	s = CoSocket(socket(AF_INET,SOCK_STREAM))
 	yield s.bind(('',port))
@@ -171,40 +66,212 @@ def server(port):
 		client,addr = yield s.accept()
 		print("+++++++++> Got a connection from %s <+++++++++" % str(addr))
 		
-		if numTempSamples > 10:
-			outputStr = str(numTempSamples) + "," + timeStr + ambTempStr + outTempStr + mainRadTempStr + libRadTempStr + radSupTempStr + h2oInTempStr + h2oOutTempStr
-			yield client.send((outputStr))
+		first, n = history.select(sinceSeq=legacySeq)
+		try:
+			if n > 10:
+				# Text is built only now, from ring buffer
+				yield client.send(history.legacyString(LEGACY_COLUMN_ORDER, first, n), CLIENT_TIMEOUT)
+				legacySeq = history.firstSeq() + first + n
 			
-			# Reset numTempSamples and all strings
-			outputStr      = ""
-			timeStr        = ""
-			ambTempStr     = ""
-			outTempStr     = ""
-			mainRadTempStr = ""
-			libRadTempStr  = ""
-			radSupTempStr  = ""
-			h2oInTempStr   = ""
-			h2oOutTempStr  = ""
-			numTempSamples = 0
+			else:
+				yield client.send(("*** Less than 10 samples available").encode('latin-1'), CLIENT_TIMEOUT)
+		except (error, WaitTimeout) as e:
+			print("*** Download client dropped: %s" % str(e))
 		
-		else:
-			yield client.send(("*** Less than 10 samples available").encode('latin-1'))
+		yield client.close()
+
+#________________________________________________
+def parseQuery(request):
+	# Parses "GET [since=<seq>] [after=<epoch>] [sensors=<i>,<j>,...] [fmt=text|bin]"
+	# Returns (sinceSeq, afterTime, sensors, binary), or None if malformed
+	fields = request.split()
+	if not fields or fields[0] != "GET":
+		return None
+	
+	sinceSeq = None
+	afterTime = None
+	sensors = range(history.numSensors)
+	binary = False
+	try:
+		for field in fields[1:]:
+			name, value = field.split("=", 1)
+			if name == "since":
+				sinceSeq = int(value)
+			elif name == "after":
+				afterTime = float(value)
+			elif name == "sensors":
+				sensors = [int(sensor) for sensor in value.split(",")]
+				for sensor in sensors:
+					if sensor < 0 or sensor >= history.numSensors:
+						return None
+			elif name == "fmt" and value in ("text", "bin"):
+				binary = (value == "bin")
+			else:
+				return None
+	except ValueError:
+		return None
+	return (sinceSeq, afterTime, sensors, binary)
+
+#________________________________________________
+# Incremental query server: client sends one request line and gets only
+#  the samples it asked for; reply starts with next sequence number to ask for
+def queryServer(port,reusePort=False):
+	s = CoSocket(socket(AF_INET,SOCK_STREAM))
+	if reusePort:
+		# Kernel spreads connections over all workers bound to port
+		s.sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+	yield s.bind(('',port))
+	yield s.listen(5)
+	while True:
+		client,addr = yield s.accept()
+		if activeQueries[0] >= MAX_QUERY_CLIENTS:
+			print("*** Too many query clients; refusing %s" % str(addr))
+			yield client.close()
+			continue
+		yield NewTask(queryHandler(client))
+
+#________________________________________________
+# Slow clients are dropped after CLIENT_TIMEOUT so they cannot pin a task
+#  and its reply in memory
+def queryHandler(client):
+	activeQueries[0] += 1
+	try:
+		request = yield client.readline(CLIENT_TIMEOUT, 256)
 		
+		query = parseQuery(request)
+		if query is None:
+			yield client.send("*** Malformed query\n", CLIENT_TIMEOUT)
+		else:
+			sinceSeq, afterTime, sensors, binary = query
+			refreshHistory()
+			first, n = history.select(sinceSeq, afterTime)
+			if binary:
+				# Packed columns sent straight from their arrays, no copies
+				yield client.sendall(history.binaryBuffers(first, n, sensors), CLIENT_TIMEOUT)
+			else:
+				yield client.send(history.rowsString(first, n, sensors), CLIENT_TIMEOUT)
+	except (error, ValueError) as e:
+		print("*** Query client error: %s" % str(e))
+	except WaitTimeout as e:
+		print("*** Query client dropped: %s" % str(e))
+	finally:
+		# Slot is freed whatever went wrong, or MAX_QUERY_CLIENTS failures lock out queries
+		activeQueries[0] -= 1
+		yield client.close()
+
+#________________________________________________
+# Sends scheduler statistics report to each client that connects
+def statsServer(port):
+	s = CoSocket(socket(AF_INET,SOCK_STREAM))
+	yield s.bind(('',port))
+	yield s.listen(1)
+	while True:
+		client,addr = yield s.accept()
+		try:
+			yield client.send(scheduler.stats.report(), CLIENT_TIMEOUT)
+		except (error, WaitTimeout) as e:
+			print("*** Stats client dropped: %s" % str(e))
 		yield client.close()
 
 #________________________________________________
-timeStr        = ""
-ambTempStr     = ""
-outTempStr     = ""
-mainRadTempStr = ""
-libRadTempStr  = ""
-radSupTempStr  = ""
-h2oInTempStr   = ""
-h2oOutTempStr  = ""
-numTempSamples = 0
-
-scheduler = Scheduler()
-scheduler.new(server(8888))
+# Periodic sampling task: sleeps until sensors are due, then runs the slow
+#  1-wire work and the file append on the scheduler's thread pool so clients
+#  are never held up
+def sampler():
+	while True:
+		yield WakeAt(sensors.nextDueTime())
+		try:
+			frame = yield RunInExecutor(acquire)
+		except IOError as e:
+			print("*** Temperature acquisition failed: %s" % str(e))
+			yield Sleep(1.0)
+			continue
+		
+		# Add to history; O(1), oldest sample dropped once full
+		history.append(frame)
+		yield RunInExecutor(store.appendFrame, frame)
+
+#________________________________________________
+# Runs on pool thread
+def acquire():
+	# Collect temperature data from sensors that are due
+	print "---------- Temperature conversion started: %s ----------" % (time.ctime(time.time()))
+	frame = sensors.readDue()
+	sensors.printReadings(frame)
+	return frame
+
+#________________________________________________
+# In a query worker, bring history up to date with what acquisition process
+#  has appended to store; mmap reads, no copying of whole files
+def refreshHistory():
+	if storeTail is not None:
+		for timestamp, valid, values in storeTail.poll():
+			history.append(TemperatureSensors.ReadingFrame(array.array('d', values), valid, timestamp))
+
+#________________________________________________
+# Query worker process: serves QUERY_PORT only, exits if collector goes away
+def queryWorker(origin):
+	global scheduler, history, storeTail
+	history = SampleHistory.SampleHistory(numSensors, capacity)
+	storeTail = SampleStore.StoreTail(STORE_DIRECTORY, "Temperature", origin)
+	refreshHistory()
+	
+	scheduler = Scheduler()
+	scheduler.new(queryServer(QUERY_PORT, reusePort=True))
+	scheduler.new(parentWatch(os.getppid()))
+	scheduler.mainloop()
+
+#________________________________________________
+# Forks one query worker; returns its pid (only in parent)
+def spawnWorker(origin):
+	pid = os.fork()
+	if pid == 0:
+		# Child must never return into parent's code; a crash exits nonzero
+		status = 1
+		try:
+			queryWorker(origin)
+			status = 0
+		except Exception:
+			traceback.print_exc()
+		finally:
+			os._exit(status)
+	return pid
+
+#________________________________________________
+# In parent: collects exit status of query workers, so none is left a zombie,
+#  and replaces any that have died so query capacity is kept
+def workerWatch(origin):
+	while True:
+		yield Sleep(WORKER_CHECK)
+		while True:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except OSError:
+				break		# no children left
+			if pid == 0:
+				break
+			if pid not in workerPids:
+				continue
+			workerPids.remove(pid)
+			if os.WIFSIGNALED(status):
+				how = "killed by signal %d" % os.WTERMSIG(status)
+			else:
+				how = "exited with status %d" % os.WEXITSTATUS(status)
+			print("*** Query worker %d %s; starting another" % (pid, how))
+			# Pool thread may be running; Python re-creates the GIL and import
+			#  lock in the child, and child only touches its own state
+			workerPids.append(spawnWorker(origin))
+
+#________________________________________________
+def parentWatch(parent):
+	while os.getppid() == parent:
+		yield Sleep(5)
+	os._exit(0)
+
+#________________________________________________
+scheduler = Scheduler(stats=SchedulerStats(), workers=1)		# one worker keeps bus access serial
+scheduler.new(server(LEGACY_PORT))
+scheduler.new(statsServer(STATS_PORT))
 
 temperatureController = DS2482.DS2482(address=0x18, busnum=2)
 #temperatureController = DS2482.DS2482()
@@ -218,32 +285,38 @@ else:
 # Select Active PullUp - required when >1 sensor connected to bus
 temperatureController.DS2482_writeConfiguration(0x01)
 
+# Sensor ROM codes and locations are kept in SensorRegistry.txt
+# Set each sensor's resolution; all sensors are due for first sample
+schedule = DS18B20.SampleSchedule(SENSOR_RATES, (SAMPLE_PERIOD, 12))
+sensors = TemperatureSensors.TemperatureSensors(temperatureController, schedule=schedule)
+schedule.configure(temperatureController, sensors.registry.romCodes())
+
+# History sized so fastest sensor's samples cover HISTORY_RETENTION
+numSensors = max(len(LEGACY_COLUMN_ORDER), len(sensors.registry.romCodes()))
+capacity = HISTORY_RETENTION // min([period for period, bits in schedule.rates])
+history = SampleHistory.SampleHistory(numSensors, capacity)
+
+# Everything collected is also appended to disk; refill history from it so a
+#  restart does not lose the retention window
+store = SampleStore.SampleStore(STORE_DIRECTORY, "Temperature", sensors.labels())
+now = time.time()
+for timestamp, valid, values in store.readRange(now - HISTORY_RETENTION, now):
+	history.append(TemperatureSensors.ReadingFrame(array.array('d', values), valid, timestamp))
+print "%d samples restored from %s" % (history.count, STORE_DIRECTORY)
+
+if QUERY_WORKERS:
+	# Workers fork before any threads start; all count sequence numbers from
+	#  same origin so a client may reach a different worker each time
+	origin = now - HISTORY_RETENTION
+	for worker in range(QUERY_WORKERS):
+		workerPids.append(spawnWorker(origin))
+	print "%d query workers on port %d" % (QUERY_WORKERS, QUERY_PORT)
+	scheduler.new(workerWatch(origin))
+else:
+	scheduler.new(queryServer(QUERY_PORT))
+scheduler.new(sampler())
+
 print "=================================================="
-sampleTime = time.time() + SAMPLE_PERIOD
-while True:
-	# Poll for connections
-	scheduler.mainloop(count=1,timeout=0)
-	
-	if time.time() > sampleTime:
-		# Time of collection
-		nowStr = time.ctime(time.time())
-		
-		# Collect temperature data
-		ambTempF, mainRadTempF, libRadTempF, radSupTempF, h2oInTempF, h2oOutTempF, outTempF = GetTemperatureData()
-		
-		# Add to strings
-		timeStr        = timeStr        + nowStr            + ","
-		ambTempStr     = ambTempStr     + str(ambTempF)     + ","
-		outTempStr     = outTempStr     + str(outTempF)     + ","
-		mainRadTempStr = mainRadTempStr + str(mainRadTempF) + ","
-		libRadTempStr  = libRadTempStr  + str(libRadTempF)  + ","
-		radSupTempStr  = radSupTempStr  + str(radSupTempF)  + ","
-		h2oInTempStr   = h2oInTempStr   + str(h2oInTempF)   + ","
-		h2oOutTempStr  = h2oOutTempStr  + str(h2oOutTempF)  + ","
-		numTempSamples += 1
-		
-		# Compute new sampleTime
-		sampleTime += SAMPLE_PERIOD
-	
-	# Short delay for some reason
-	time.sleep(0.1)
+
+# Idles in select until a client, a finished frame or next sample time
+scheduler.mainloop()
@@ -0,0 +1,160 @@
+"""
+Shared DS18B20 temperature acquisition for all 1-wire sensor programs.
+
+Readings are returned as a ReadingFrame: an array('d') of deg F values in
+registry order, a validity bitmask and a timestamp. Valid bits mark only
+readings taken for that frame; on a per-sensor schedule, sensors not due keep
+their last good value, marked in a second (held) bitmask for legacy clients.
+Last touched: 10/18/2026
+"""
+
+import array
+import time
+import DS2482
+import DS18B20
+import SensorRegistry
+
+INVALID_TEMP = -999		# value reported to legacy clients for missing readings
+
+class ReadingFrame(object):
+	"""One set of readings: values[i] was read at timestamp only if bit i of valid
+	is set, and is a good (possibly earlier) reading if bit i of held is set."""
+	__slots__ = ('values', 'valid', 'timestamp', 'held')
+
+	#________________________________________________
+	def __init__(self, values, valid, timestamp, held=None):
+		self.values = values			# array('d'), deg F
+		self.valid = valid				# bitmask, bit i set if values[i] was read for this frame
+		self.timestamp = timestamp		# epoch seconds
+		self.held = valid if held is None else held		# bitmask, bit i set if values[i] is good
+
+	#________________________________________________
+	def isValid(self, sensor):
+		return (self.valid >> sensor) & 1 == 1
+
+	#________________________________________________
+	def value(self, sensor, default=INVALID_TEMP):
+		"""Return latest good reading for sensor, or default if none is held"""
+		if sensor < len(self.values) and (self.held >> sensor) & 1:
+			return self.values[sensor]
+		return default
+
+	#________________________________________________
+	def legacyValues(self, count=None):
+		"""Return values as list with INVALID_TEMP for missing readings"""
+		if count is None:
+			count = len(self.values)
+		return [self.value(i) for i in range(count)]
+
+#________________________________________________
+def convertScratchpads(scratchPads, values=None, sensors=None):
+	"""Convert list of raw scratchpads (None if no presence) to deg F in one pass.
+	Fills values array('d') (created if None); returns (values, valid bitmask).
+	sensors gives sensor numbers for messages if scratchPads is not in sensor order.
+	"""
+	if values is None:
+		values = array.array('d', [0.0] * len(scratchPads))
+	crcTable = DS2482.CRC_TABLE
+	valid = 0
+	for i in range(len(scratchPads)):
+		scratchPad = scratchPads[i]
+		sensor = i if sensors is None else sensors[i]
+		if scratchPad is None:
+			print("*** No presence pulse for sensor %d" % (sensor))
+			continue
+
+		crc8 = 0
+		for byte in scratchPad:
+			crc8 = crcTable[crc8 ^ byte]
+		if crc8 != 0:
+			print("*** scratchPad data checksum BAD for sensor %d" % (sensor))
+			continue
+
+		# Scratchpad bytes 0 (LSB) & 1 (MSB) are signed 1/16 deg C
+		raw = DS18B20.rawTemperature(scratchPad)
+		values[i] = 9.0 / 5.0 * (raw / 16.0) + 32.0
+		valid |= 1 << i
+
+	return values, valid
+
+class TemperatureSensors(object):
+	"""DS18B20 sensors on a DS2482 bus, found through a SensorRegistry."""
+
+	#________________________________________________
+	def __init__(self, controller, registry=None, schedule=None):
+		self.controller = controller
+		if registry is None:
+			registry = SensorRegistry.SensorRegistry()
+			registry.loadOrDiscover(controller)
+		self.registry = registry
+		self.schedule = schedule
+		self._latest = array.array('d')
+		self._latestValid = 0
+
+	#________________________________________________
+	def labels(self):
+		return self.registry.labels
+
+	#________________________________________________
+	def printReadings(self, frame):
+		"""Print one line per sensor: label and latest reading"""
+		labels = self.registry.labels
+		for sensor in range(len(labels)):
+			if (frame.held >> sensor) & 1:
+				print("%-32s= %0.1f deg F" % (labels[sensor], frame.values[sensor]))
+			else:
+				print("%-32s= ---" % (labels[sensor]))
+
+	#________________________________________________
+	def readAll(self):
+		"""Convert all sensors at once (Skip ROM), then read every scratchpad.
+		Returns ReadingFrame.
+		"""
+		controller = self.controller
+		romCodes = self.registry.romCodes()
+
+		started = controller.DS2482_owStartConversion()
+		timestamp = time.time()
+		if started:
+			controller.DS2482_owWaitForConversion()
+			scratchPads = [DS18B20.readScratchpad(controller, rom) for rom in romCodes]
+		else:
+			print("*** No presence pulse; temperature conversion not started")
+			scratchPads = [None] * len(romCodes)
+		values, valid = convertScratchpads(scratchPads)
+
+		# Re-run sensor search if bus topology appears to have changed
+		self.registry.noteSample(controller, list(range(len(romCodes))), valid)
+		return ReadingFrame(values, valid, timestamp)
+
+	#________________________________________________
+	def nextDueTime(self):
+		return self.schedule.nextDueTime()
+
+	#________________________________________________
+	def readDue(self):
+		"""Sample only sensors due on schedule. Returns ReadingFrame valid only
+		for sensors read now; others keep their last good value, marked in held.
+		"""
+		romCodes = self.registry.romCodes()
+		timestamp = time.time()
+		readings = self.schedule.service(self.controller, romCodes)
+
+		latest = self._latest
+		while len(latest) < len(romCodes):
+			latest.append(0.0)
+
+		sensors = [sensor for sensor, scratchPad in readings]
+		values, valid = convertScratchpads([scratchPad for sensor, scratchPad in readings], sensors=sensors)
+		fresh = 0
+		for i in range(len(readings)):
+			sensor = readings[i][0]
+			if (valid >> i) & 1:
+				latest[sensor] = values[i]
+				fresh |= 1 << sensor
+				self._latestValid |= 1 << sensor
+			else:
+				self._latestValid &= ~(1 << sensor)
+
+		self.registry.noteSample(self.controller, sensors, valid)
+		return ReadingFrame(array.array('d', latest), fresh, timestamp, self._latestValid)
@@ -2,160 +2,44 @@
 Responds to commands from Mac, including collecting temperature data.
 
 Works with XCode BeagleBoneClient.
-Last touched: 08/18/2017
+Commands are lines "Cmd: <n> [id]"; any number of clients may connect and
+send several commands without waiting for replies. A command with an id is
+answered "Re: <id> <reply>" plus newline; without an id the reply is sent
+bare, as BeagleBoneClient expects.
+Cmd 1 readings are cached for READING_TTL seconds; requests arriving while
+a bus read is in progress wait for it rather than starting another, so bus
+load does not grow with the number of clients.
+"Cmd: 3 [id] [sensors=0,3] [deadband=0.5]" subscribes: the connection then
+receives a line "<epoch seconds> <values>" for each new reading (values for
+the listed reading positions, all if none given; only when one has moved by
+deadband deg F since the last line sent). One acquisition every
+SUBSCRIBE_PERIOD feeds all subscribers; each has a short send queue, and a
+slow subscriber loses its oldest unsent lines. "Cmd: 4" ends a subscription.
+Readings are drawn on the matrix by MatrixBarGraph, which only rewrites
+columns that changed.
+Last touched: 10/18/2026
 """
 
 from socket import *
 import DS2482
-import array
+import TemperatureSensors
 import time
+import collections
+from Scheduler import *
+from CoSocket import CoSocket
 from Adafruit_LED_Backpack import Matrix8x8
+from MatrixBarGraph import MatrixBarGraph
 
-# Temperature sensor codes and locations
-# Sensor 0 (0x5F000003AA865228) - breadboard, basement ambient temperature
-# Sensor 1 (0xB1000003AA618A28) - main house radiator return temperature
-# Sensor 2 (0xD5000003AA892E28) - library radiator return temperature
-# Sensor 3 (0xFA000003AAABC228) - radiator supply temperature
-# Sensor 4 (0x77000003AA72EB28) - H20 heater input temperature
-# Sensor 5 (0x16000003AAAA6E28) - H20 heater output temperature
-# Sensor 6 (0xBC0000043EFFC128) - Outside temperature
-romCode = [[0x28,0x52,0x86,0xAA,0x03,0x00,0x00,0x5F], 
-		   [0x28,0x8A,0x61,0xAA,0x03,0x00,0x00,0xB1], 
-		   [0x28,0x2E,0x89,0xAA,0x03,0x00,0x00,0xD5], 
-		   [0x28,0xC2,0xAB,0xAA,0x03,0x00,0x00,0xFA], 
-		   [0x28,0x6E,0xAA,0xAA,0x03,0x00,0x00,0x16], 
-		   [0x28,0xEB,0x72,0xAA,0x03,0x00,0x00,0x77], 
-		   [0x28,0xC1,0xFF,0x3E,0x04,0x00,0x00,0xBC]]	
-
-crcTable = [0, 94, 188, 226, 97, 63, 221, 131, 194, 156, 126, 32, 163, 253, 31, 65,
-			157, 195, 33, 127, 252, 162, 64, 30, 95, 1, 227, 189, 62, 96, 130, 220,
-			35, 125, 159, 193, 66, 28, 254, 160, 225, 191, 93, 3, 128, 222, 60, 98,
-			190, 224, 2, 92, 223, 129, 99, 61, 124, 34, 192, 158, 29, 67, 161, 255,
-			70, 24, 250, 164, 39, 121, 155, 197, 132, 218, 56, 102, 229, 187, 89, 7,
-			219, 133, 103, 57, 186, 228, 6, 88, 25, 71, 165, 251, 120, 38, 196, 154,
-			101, 59, 217, 135, 4, 90, 184, 230, 167, 249, 27, 69, 198, 152, 122, 36,
-			248, 166, 68, 26, 153, 199, 37, 123, 58, 100, 134, 216, 91, 5, 231, 185,
-			140, 210, 48, 110, 237, 179, 81, 15, 78, 16, 242, 172, 47, 113, 147, 205,
-			17, 79, 173, 243, 112, 46, 204, 146, 211, 141, 111, 49, 178, 236, 14, 80,
-			175, 241, 19, 77, 206, 144, 114, 44, 109, 51, 209, 143, 12, 82, 176, 238,
-			50, 108, 142, 208, 83, 13, 239, 177, 240, 174, 76, 18, 145, 207, 45, 115,
-			202, 148, 118, 40, 171, 245, 23, 73, 8, 86, 180, 234, 105, 55, 213, 139,
-			87, 9, 235, 181, 54, 104, 138, 212, 149, 203, 41, 119, 244, 170, 72, 22,
-			233, 183, 85, 11, 136, 214, 52, 106, 43, 117, 151, 201, 74, 20, 246, 168,
-			116, 42, 200, 150, 21, 75, 169, 247, 182, 232, 10, 84, 215, 137, 107, 53]
-
-#________________________________________________
-def GetTemperatureData():
-	# Initiate temperature conversion for all sensors
-	# 	Send 1-Wire Reset
-	# 	Send Skip ROM command (address all 1-Wire devices)
-	# 	Send Convert T command
-	# 	Start temperature conversion timer
-	
-	# All DS18B20 transactons start with initialization (reset OW bus)
-	temperatureController.DS2482_owReset()
-	
-	# Send DS18B20 Skip ROM command
-	temperatureController.DS2482_owWriteByte(0xCC)		# DS18B20 Skip ROM
-	
-	# Send DS18B20 Convert T command
-	temperatureController.DS2482_owWriteByte(0x44)		# DS18B20 Convert T
-	
-	# Capture and display conversion time
-	timestr = time.ctime(time.time())
-	print "---------- Temperature conversion started: %s ----------" % (timestr)
-	
-	# Wait for temperature conversion (750 ms for 12 bits)
-	time.sleep(0.8)
-	
-	# Individually read temperature from each connected sensor
-	# 	Send 1-Wire Reset
-	# 	Send Match ROM command
-	# 	Send Read Scratchpad command
-	# 	Repeat 9 times
-	# 	Repeat 8 times
-	# 	Send 1-Wire Read Byte command
-	# 	Set DS2482 read pointer to Data Register
-	# 	Read byte from DS2482
-	# 	Convert data to temperature
-	
-	ambTempF		= -999
-	mainRadTempF	= -999
-	libRadTempF		= -999
-	radSupTempF		= -999
-	h2oInTempF		= -999
-	h2oOutTempF		= -999
-	outTempF		= -999
-	for sensor in range(7):
-		# All DS18B20 transactons start with initialization (reset OW bus)
-		temperatureController.DS2482_owReset()
-		
-		# Send DS18B20 Match ROM command
-		temperatureController.DS2482_owWriteByte(0x55)		# DS18B20 Match ROM
-		
-		# Send 8 bytes of ROM code
-		for romByte in range(8):
-			temperatureController.DS2482_owWriteByte(romCode[sensor][romByte])
-		
-		# Send DS18B20 Read Scratchpad command
-		temperatureController.DS2482_owWriteByte(0xBE)		# DS18B20 Read Scratchpad
-		
-		crc8 = 0
-		scratchPad = array.array('B',[])
-		# Read 9 bytes of scratchpad
-		for i in range(9):
-			temperatureController.DS2482_owReadByte()
-			
-			# Set read pointer
-			temperatureController.DS2482_setReadPointer(DS2482.DS2482_READ_DATA_REG)
-			
-			# Read byte from DS2482
-			scratchPad.append(temperatureController._device.readRaw8())		
-			crc8 = crcTable[crc8 ^ scratchPad[i]]
-		
-		if crc8 == 0:
-			# Convert scratchpad bytes 0 (LSB) & 1 (MSB) to temperature
-			temperatureDegC = (scratchPad[0] / 16.0) + (scratchPad[1] & 0x07) * 16.0;
-			if scratchPad[1] & 0x08:		# temperature <0 deg C
-				temperatureDegC = temperatureDegC - 128.0
-			
-			temperatureDegF = 9.0 / 5.0 * temperatureDegC + 32.0
-			
-			if sensor == 0:
-				ambTempF = temperatureDegF
-				print "Basement ambient temperature\t\t= %0.1f deg F" % (ambTempF)
-			
-			elif sensor == 1:
-				mainRadTempF = temperatureDegF
-				print "Main house radiator return temperature\t= %0.1f deg F" % (mainRadTempF)
-			
-			elif sensor == 2:
-				libRadTempF = temperatureDegF
-				print "Library radiator return temperature\t= %0.1f deg F" % (libRadTempF)
-			
-			elif sensor == 3:
-				radSupTempF = temperatureDegF
-				print "Radiator supply temperature\t\t= %0.1f deg F" % (radSupTempF)
-			
-			elif sensor == 4:
-				h2oInTempF = temperatureDegF
-				print "H20 heater input temperature\t\t= %0.1f deg F" % (h2oInTempF)
-			
-			elif sensor == 5:
-				h2oOutTempF = temperatureDegF
-				print "H20 heater output temperature\t\t= %0.1f deg F" % (h2oOutTempF)
-			
-			elif sensor == 6:
-				outTempF = temperatureDegF
-				print "Outside temperature\t\t\t= %0.1f deg F" % (outTempF)
-			
-			else:
-				print "*** Need to add some code!!!"
-					
-		else:
-			print "*** scratchPad data checksum BAD for sensor %d" % (sensor)
-			
-	return (ambTempF,mainRadTempF,libRadTempF,radSupTempF,h2oInTempF,h2oOutTempF,outTempF)
+SERVER_PORT = 8888
+MAX_COMMAND = 256			# longest command line accepted, bytes
+COMMAND_LINGER = 0.2		# seconds to wait for newline after a fragment that is not a whole command
+READING_TTL = 5.0			# seconds a temperature reading is served from cache
+SUBSCRIBE_PERIOD = 10.0		# seconds between readings while anyone is subscribed; >= READING_TTL
+SUBSCRIBER_QUEUE = 8		# lines queued per subscriber; oldest dropped beyond this
+CLIENT_TIMEOUT = 30			# seconds a subscriber may stall a send before being dropped
+SUBSCRIBE_COMMAND = 3
+UNSUBSCRIBE_COMMAND = 4
+DISPLAY_SELF_TEST = False	# walk every matrix pixel at startup (about 6.5 s)
 
 # Create display with specific I2C address and/or bus
 display = Matrix8x8.Matrix8x8(address=0x71, busnum=2)
@@ -172,15 +56,12 @@ LIB_RETURN_COL    = 2
 H2O_COLD_COL      = 1
 H2O_HOT_COL       = 0
 
-# Run through each pixel individually and turn it on
-for y in range(7, -1, -1):
-	for x in range(7, -1, -1):
-		display.clear()				# clear display buffer
-		display.set_pixel(x, y, 1)	# set pixel at position i, j to on; to turn off a pixel set last parameter to 0
-		display.write_display()		# write display buffer to hardware; this must be called to update actual display LEDs
-		time.sleep(0.1)				# short delay
-display.clear()
-display.write_display()
+# Bar for each reading, in legacyValues order
+barGraph = MatrixBarGraph(display, [IN_AMBIENT_COL, MAIN_RETURN_COL, LIB_RETURN_COL,
+	BOILER_SUPPLY_COL, H2O_COLD_COL, H2O_HOT_COL, OUT_AMBIENT_COL])
+barGraph.clear()
+if DISPLAY_SELF_TEST:
+	barGraph.selfTest()
 
 print "========================================"
 
@@ -196,230 +77,313 @@ else:
 # Select Active PullUp - required when >1 sensor connected to bus
 temperatureController.DS2482_writeConfiguration(0x01)
 
-s = socket(AF_INET, SOCK_STREAM)	# create TCP socket
-s.bind(('',8888))					# bind to port 8888
-s.listen(2)							# listen, but allow no more than 2 pending connections
-client,addr = s.accept()			# get a connection
-print("--- Got a connection from %s ---" % str(addr))
+# Sensor ROM codes and locations are kept in SensorRegistry.txt
+sensors = TemperatureSensors.TemperatureSensors(temperatureController)
+
+#________________________________________________
+def parseCommand(line):
+	# Returns (cmdNum, requestId, options); cmdNum 999 if malformed, requestId
+	#  None if absent, options dict of name=value fields
+	fields = line.split()
+	if len(fields) < 2 or fields[0] != "Cmd:":
+		print("*** Malformed command from Mac")
+		return 999, None, {}
+	requestId = None
+	options = {}
+	for field in fields[2:]:
+		if "=" in field:
+			name, value = field.split("=", 1)
+			options[name] = value
+		elif requestId is None:
+			requestId = field
+	try:
+		return int(fields[1]), requestId, options
+	except ValueError:
+		print("*** Malformed command from Mac")
+		return 999, requestId, options
 
-notDone = True
-while notDone:
-#	client,addr = s.accept()		# get a connection
-#	print("\n--- Got a connection from %s ---" % str(addr))
+#________________________________________________
+def wholeCommand(data):
+	# True if unterminated data is a whole "Cmd: <n>", as BeagleBoneClient
+	#  sends without newline; it is then handled without waiting for linger
+	fields = data.split()
+	return len(fields) == 2 and fields[0] == b"Cmd:" and fields[1].isdigit()
+
+#________________________________________________
+def parseSubscription(options):
+	# Returns (reading positions, deadband); ValueError if options are bad
+	positions = range(7)
+	if "sensors" in options:
+		positions = [int(field) for field in options["sensors"].split(",")]
+		for position in positions:
+			if not 0 <= position < 7:
+				raise ValueError("no reading %d" % position)
+	deadband = float(options.get("deadband", 0.0))
+	if deadband < 0:
+		raise ValueError("negative deadband")
+	return positions, deadband
+
+#________________________________________________
+# Command handlers: coroutines whose last value is reply string
+
+#________________________________________________
+def timeCommand():					# return time string
+	yield time.ctime(time.time()) + "\r\n"
+
+#________________________________________________
+def temperatureCommand():			# return temperature data
+	try:
+		readings = yield readingCache.get()
+	except (IOError, OSError) as e:
+		# Bus error; every client sharing this read gets it, server carries on
+		print("*** Temperature read failed: %s" % str(e))
+		yield "*** Temperature read failed: %s" % str(e)
+		return
+	yield ",".join([str(temp) for temp in readings])
+
+#________________________________________________
+def echoCommand():					# not used; echo cmdNum
+	yield "cmdNum = 2"
+
+#________________________________________________
+def unsubscribeCommand():			# only meaningful during subscription
+	yield "*** Not subscribed"
+
+#________________________________________________
+def shutdownCommand():				# terminate this program
+	yield "cmdNum = 9; shutting down"
+
+COMMANDS = {
+	0: timeCommand,
+	1: temperatureCommand,
+	2: echoCommand,
+	UNSUBSCRIBE_COMMAND: unsubscribeCommand,
+	9: shutdownCommand,
+}
+
+# Latest readings, shared by all clients. get() returns cached readings while
+#  fresh; otherwise the first caller reads the bus and any caller arriving
+#  meanwhile waits on that read's Event.
+class ReadingCache(object):
+	def __init__(self,ttl):
+		self.ttl = ttl
+		self.readings = None
+		self.timestamp = 0.0		# conversion start of cached readings
+		self.pending = None			# Event for read in progress
 	
-	# First we receive a command
-	inCmd = client.recv(64)			# bufsize
-#	print(" inCmd = %s" % inCmd.strip())
+	def get(self):
+		if self.readings is not None and time.time() - self.timestamp < self.ttl:
+			yield self.readings
+			return
+		if self.pending is not None:
+			readings = yield self.pending.wait()
+			yield readings
+			return
+		
+		event = self.pending = Event()
+		try:
+			readings = yield self.acquire()
+		except Exception as e:
+			self.pending = None
+			event.set(exception=e)
+			raise
+		self.pending = None
+		event.set(readings)
+		yield readings
 	
-	cmdStr = str(inCmd.split()[0])
-#	print("   cmdStr = %s" % cmdStr)
-	if cmdStr != "Cmd:":
-		print("*** Malformed command from Mac")
-		cmdNum = 999
-	else:
-		cmdNum = int(inCmd.split()[1])
-		print(">>> cmdNum= %d" % cmdNum)
+	def acquire(self):
+		print "---------- Temperature conversion started: %s ----------" % (time.ctime(time.time()))
+		# Bus and display work on scheduler's thread pool; other clients carry on
+		frame = yield RunInExecutor(sensors.readAll)
+		sensors.printReadings(frame)
+		
+		readings = frame.legacyValues(7)
+		yield RunInExecutor(barGraph.show, readings)
+		self.readings = readings
+		self.timestamp = frame.timestamp
+		for subscriber in subscribers:
+			subscriber.publish(readings, frame.timestamp)
+		yield readings
+
+readingCache = ReadingCache(READING_TTL)
+
+subscribers = []
+publisherWakeup = [None]		# Event publisher waits on while nobody is subscribed
+
+# One subscribed connection. publish() queues a line when readings have moved
+#  past deadband; sender() is a task writing queued lines to client, so a
+#  slow client holds up nobody else.
+class Subscriber(object):
+	def __init__(self,client,requestId,positions,deadband):
+		self.client = client
+		self.prefix = "" if requestId is None else "Re: %s " % requestId
+		self.positions = positions
+		self.deadband = deadband
+		self.last = None			# values in last line queued
+		self.queue = collections.deque(maxlen=SUBSCRIBER_QUEUE)
+		self.dropped = 0
+		self.wakeup = None			# Event sender waits on while queue is empty
+		self.closed = False
+		self.finished = Event()		# set when sender has stopped
 	
-	# Then we decode the command and respond
-	if cmdNum == 0:					# return time string
-		timestr = time.ctime(time.time()) + "\r\n"
-		client.send(timestr.encode('ascii'))
+	def publish(self,readings,timestamp):
+		values = [readings[position] for position in self.positions]
+		if self.last is not None:
+			if max([abs(value - last) for value, last in zip(values, self.last)]) < self.deadband:
+				return
+		self.last = values
+		self.push("%s%d %s\n" % (self.prefix, timestamp, ",".join([str(value) for value in values])))
 	
-	elif cmdNum == 1:				# return temperature data
-		ambTempF,mainRadTempF,libRadTempF,radSupTempF,h2oInTempF,h2oOutTempF,outTempF = GetTemperatureData()
-		temperatureStr = (str(ambTempF) + "," + str(mainRadTempF) + "," + str(libRadTempF) + "," + 
-						str(radSupTempF) + "," + str(h2oInTempF) + "," + str(h2oOutTempF) + "," + str(outTempF))
-		client.send(temperatureStr)
-		
-		# Set matrix columns
-		display.clear()
-		# Inside ambient
-		if ambTempF > 0:
-			display.set_pixel(7, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 20:
-			display.set_pixel(6, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 40:
-			display.set_pixel(5, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 60:
-			display.set_pixel(4, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 80:
-			display.set_pixel(3, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 100:
-			display.set_pixel(2, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 120:
-			display.set_pixel(1, IN_AMBIENT_COL, 1)
-		
-		if ambTempF > 140:
-			display.set_pixel(0, IN_AMBIENT_COL, 1)
-		
-		# Outside ambient
-		if outTempF > 0:
-			display.set_pixel(7, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 20:
-			display.set_pixel(6, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 40:
-			display.set_pixel(5, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 60:
-			display.set_pixel(4, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 80:
-			display.set_pixel(3, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 100:
-			display.set_pixel(2, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 120:
-			display.set_pixel(1, OUT_AMBIENT_COL, 1)
-		
-		if outTempF > 140:
-			display.set_pixel(0, OUT_AMBIENT_COL, 1)
-		
-		# Radiator supply
-		if radSupTempF > 0:
-			display.set_pixel(7, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 20:
-			display.set_pixel(6, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 40:
-			display.set_pixel(5, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 60:
-			display.set_pixel(4, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 80:
-			display.set_pixel(3, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 100:
-			display.set_pixel(2, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 120:
-			display.set_pixel(1, BOILER_SUPPLY_COL, 1)
-		
-		if radSupTempF > 140:
-			display.set_pixel(0, BOILER_SUPPLY_COL, 1)
-		
-		# Radiator main return
-		if mainRadTempF > 0:
-			display.set_pixel(7, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 20:
-			display.set_pixel(6, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 40:
-			display.set_pixel(5, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 60:
-			display.set_pixel(4, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 80:
-			display.set_pixel(3, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 100:
-			display.set_pixel(2, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 120:
-			display.set_pixel(1, MAIN_RETURN_COL, 1)
-		
-		if mainRadTempF > 140:
-			display.set_pixel(0, MAIN_RETURN_COL, 1)
-				
-		# Radiator library return
-		if libRadTempF > 0:
-			display.set_pixel(7, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 20:
-			display.set_pixel(6, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 40:
-			display.set_pixel(5, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 60:
-			display.set_pixel(4, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 80:
-			display.set_pixel(3, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 100:
-			display.set_pixel(2, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 120:
-			display.set_pixel(1, LIB_RETURN_COL, 1)
-		
-		if libRadTempF > 140:
-			display.set_pixel(0, LIB_RETURN_COL, 1)
-		
-		# H2O supply (cold)
-		if h2oInTempF > 0:
-			display.set_pixel(7, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 20:
-			display.set_pixel(6, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 40:
-			display.set_pixel(5, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 60:
-			display.set_pixel(4, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 80:
-			display.set_pixel(3, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 100:
-			display.set_pixel(2, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 120:
-			display.set_pixel(1, H2O_COLD_COL, 1)
-		
-		if h2oInTempF > 140:
-			display.set_pixel(0, H2O_COLD_COL, 1)
-		
-		# H2O out (hot)
-		if h2oOutTempF > 0:
-			display.set_pixel(7, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 20:
-			display.set_pixel(6, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 40:
-			display.set_pixel(5, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 60:
-			display.set_pixel(4, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 80:
-			display.set_pixel(3, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 100:
-			display.set_pixel(2, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 120:
-			display.set_pixel(1, H2O_HOT_COL, 1)
-		
-		if h2oOutTempF > 140:
-			display.set_pixel(0, H2O_HOT_COL, 1)
-		
-		display.write_display()
+	def push(self,line):
+		if len(self.queue) == self.queue.maxlen:
+			self.dropped += 1		# deque drops oldest; newest readings win
+		self.queue.append(line)
+		self.wake()
 	
-	elif cmdNum == 2:				# not used; echo cmdNum
-		client.send("cmdNum = 2")
+	def wake(self):
+		if self.wakeup is not None:
+			wakeup, self.wakeup = self.wakeup, None
+			wakeup.set()
 	
-	elif cmdNum == 9:				# terminate this program
-		client.send("cmdNum = 9; shutting down")
-		notDone = False
+	# Stop taking readings; sender exits once queue is flushed
+	def stop(self):
+		if self in subscribers:
+			subscribers.remove(self)
+		self.closed = True
+		self.wake()
 	
+	def sender(self):
+		try:
+			while True:
+				if self.queue:
+					yield self.client.send(self.queue.popleft(), CLIENT_TIMEOUT)
+				elif self.closed:
+					break
+				else:
+					self.wakeup = Event()
+					yield self.wakeup.wait()
+		except (error, WaitTimeout) as e:
+			print("*** Subscriber dropped: %s" % str(e))
+			self.stop()
+			try:
+				self.client.sock.shutdown(SHUT_RDWR)	# clientHandler's read sees end of file
+			except error:
+				pass
+		if self.dropped:
+			print("*** Subscriber too slow; %d lines dropped" % self.dropped)
+		self.finished.set()
+
+#________________________________________________
+# Stream readings to client until it unsubscribes; returns reply to
+#  unsubscribe, or None if client has gone
+def subscribeCommand(client,requestId,options):
+	try:
+		positions, deadband = parseSubscription(options)
+	except ValueError as e:
+		yield "*** Malformed subscription: %s" % str(e)
+		return
+	
+	subscriber = Subscriber(client, requestId, positions, deadband)
+	subscriber.push("%ssubscribed\n" % subscriber.prefix)
+	if readingCache.readings is not None:
+		subscriber.publish(readingCache.readings, readingCache.timestamp)
+	subscribers.append(subscriber)
+	yield NewTask(subscriber.sender())
+	if publisherWakeup[0] is not None:
+		publisherWakeup[0].set()
+	
+	connected = True
+	try:
+		while True:
+			line = yield client.readline(None, MAX_COMMAND, COMMAND_LINGER, wholeCommand)
+			if not line:
+				connected = False
+				break
+			if not line.strip():
+				continue
+			if parseCommand(line)[0] == UNSUBSCRIBE_COMMAND:
+				break
+			print("*** Command ignored during subscription")
+	except (error, ValueError) as e:
+		print("*** Client error: %s" % str(e))
+		connected = False
+	
+	subscriber.stop()
+	yield subscriber.finished.wait()
+	if connected:
+		yield "unsubscribed"
 	else:
-		print("*** Unexpected command number")
-		client.send("*** Unexpected command number")
+		yield None
+
+#________________________________________________
+# Take readings every SUBSCRIBE_PERIOD while anyone is subscribed;
+#  ReadingCache.acquire publishes them (and any taken for Cmd 1)
+def publisher():
+	while True:
+		if not subscribers:
+			publisherWakeup[0] = Event()
+			yield publisherWakeup[0].wait()
+			publisherWakeup[0] = None
+		try:
+			yield readingCache.get()
+		except Exception as e:
+			print("*** Reading for subscribers failed: %s" % str(e))
+		deadline = readingCache.timestamp + SUBSCRIBE_PERIOD
+		if deadline <= time.time():
+			deadline = time.time() + SUBSCRIBE_PERIOD
+		yield WakeAt(deadline)
+
+#________________________________________________
+def server(port):
+	s = CoSocket(socket(AF_INET, SOCK_STREAM))	# create TCP socket
+	yield s.bind(('',port))
+	yield s.listen(5)
+	while True:
+		client,addr = yield s.accept()		# get a connection
+		print("--- Got a connection from %s ---" % str(addr))
+		yield NewTask(clientHandler(client))
+
+#________________________________________________
+# One task per client; commands are taken in order from buffered input, so
+#  pipelined or fragmented commands are handled like single ones
+def clientHandler(client):
+	shutdown = False
+	try:
+		while not shutdown:
+			line = yield client.readline(None, MAX_COMMAND, COMMAND_LINGER, wholeCommand)
+			if not line:
+				break
+			if not line.strip():
+				continue
+			
+			cmdNum, requestId, options = parseCommand(line)
+			handler = COMMANDS.get(cmdNum)
+			if cmdNum == SUBSCRIBE_COMMAND:
+				print(">>> cmdNum= %d" % cmdNum)
+				reply = yield subscribeCommand(client, requestId, options)
+				if reply is None:
+					break
+			elif handler is None:
+				print("*** Unexpected command number")
+				reply = "*** Unexpected command number"
+			else:
+				print(">>> cmdNum= %d" % cmdNum)
+				reply = yield handler()
+			
+			if requestId is not None:
+				reply = "Re: %s %s\n" % (requestId, reply.rstrip("\r\n"))
+			yield client.send(reply)
+			shutdown = (cmdNum == 9)
+	except (error, ValueError) as e:
+		print("*** Client error: %s" % str(e))
 	
-client.close()
-print("client.close - bye")
+	yield client.close()
+	print("client.close - bye")
+	if shutdown:
+		raise SystemExit		# ends mainloop and program
+
+#________________________________________________
+scheduler = Scheduler(workers=1)		# one worker keeps bus access serial
+scheduler.new(server(SERVER_PORT))
+scheduler.new(publisher())
+scheduler.mainloop()
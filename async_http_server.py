@@ -1,94 +1,310 @@
 """
-Asychronous HTTP server using asynchat.
+Asychronous HTTP server using asyncio.
 
-From Python Essential Reference, page 453.
-Last touched: 08/16/2017
+From Python Essential Reference, page 453; moved from asyncore/asynchat to
+an asyncio Protocol. Files are sent with loop.sendfile (os.sendfile, no
+copies through Python, where the platform has it). Connections follow
+HTTP/1.1 keep-alive: requests are parsed from a buffer one at a time, so
+pipelined requests are answered in order, and headers are limited to
+MAX_HEADER bytes. GET and HEAD only; files are served from the current
+directory.
+
+Sample data collected in STORE_DIRECTORY is served as JSON or CSV
+(?format=json|csv) by SampleExport:
+  /api/<prefix>/latest					most recent sample
+  /api/<prefix>/range?start=&end=&sensors=0,3	samples with start < time <= end
+  /api/<prefix>/series/<sensor>?start=&end=		one sensor
+where prefix is a store name such as Temperature or Baro and times are epoch
+seconds (start defaults to UTC midnight, end to now). Bodies are streamed in
+chunks as the connection drains. Each carries an ETag and Last-Modified
+worked out from the day files alone, so If-None-Match/If-Modified-Since
+requests for unchanged data get 304 without any formatting.
+
+Python 3 only (asyncio); written without async syntax.
+Last touched: 10/18/2026
 """
 
-import asynchat, asyncore, socket
-import os
+import asyncio
 import mimetypes
-try:
-	from http.client import responses	# Python 3
-except ImportError:
-	from httplib import responses		# Python 2
-
-# This class plugs into the asyncore module and handles accept events
-class async_http(asyncore.dispatcher):
-	def __init__(self,port):
-		asyncore.dispatcher.__init__(self)
-		self.create_socket(socket.AF_INET,socket.SOCK_STREAM)
-		self.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-		self.bind(('',port))
-		self.listen(5)
-	
-	def handle_accept(self):
-		client,addr = self.accept()
-		return async_http_handler(client)
-
-# Class that handles asynchronous HTTP requests
-class async_http_handler(asynchat.async_chat):
-	def __init__(self,conn=None):
-		asynchat.async_chat.__init__(self,conn)
-		self.data = [];
-		self.got_header = False
-		self.set_terminator(b"\r\n\r\n")
-	
-	# Get incoming data and append to data buffer
-	def collect_incoming_data(self,data):
-		if not self.got_header:
-			self.data.append(data)
-	
-	# Got a terminator (blank line)
-	def found_terminator(self):
-		self.got_header = True
-		header_data = b"".join(self.data)
+import os
+import posixpath
+import time
+import traceback
+from email.utils import formatdate, parsedate_to_datetime
+from http.client import responses
+from urllib.parse import unquote, parse_qsl
+import SampleExport
+
+PORT = 8888
+MAX_HEADER = 8192			# bytes of request line and headers accepted
+MAX_PIPELINE = 65536		# bytes of unanswered requests buffered before reading pauses
+KEEPALIVE_TIMEOUT = 15		# seconds an idle connection is kept open
+STORE_DIRECTORY = "SampleData"	# where collectors keep SampleStore day files
+API_PREFIX = "/api/"
+STREAM_BATCH = 8			# chunks written before letting other connections run
+
+# Class that handles one connection
+class async_http_handler(asyncio.Protocol):
+	def __init__(self):
+		self.transport = None
+		self.buffer = bytearray()	# received, not yet parsed
+		self.busy = False			# sendfile or stream in progress; later requests wait
+		self.closing = False
+		self.streaming = None		# (chunks generator, chunked, keepalive)
+		self.paused = False			# transport's write buffer is full
+		self.idle = None			# keep-alive timer
+
+	def connection_made(self,transport):
+		self.transport = transport
+		self.loop = asyncio.get_event_loop()
+		self.resetidle()
+
+	def connection_lost(self,exc):
+		self.closing = True
+		if self.idle is not None:
+			self.idle.cancel()
+		if self.streaming is not None:
+			self.streaming[0].close()		# closes store files
+			self.streaming = None
+
+	# Flow control from transport
+	def pause_writing(self):
+		self.paused = True
+
+	def resume_writing(self):
+		self.paused = False
+		if self.streaming is not None:
+			self.stream()
+
+	# Get incoming data and answer any complete requests
+	def data_received(self,data):
+		self.buffer.extend(data)
+		self.resetidle()
+		if len(self.buffer) > MAX_PIPELINE:
+			self.transport.pause_reading()		# resumed once backlog is answered
+		self.process()
+
+	def resetidle(self):
+		if self.idle is not None:
+			self.idle.cancel()
+		self.idle = self.loop.call_later(KEEPALIVE_TIMEOUT, self.idletimeout)
+
+	def idletimeout(self):
+		if not self.busy:
+			self.close()
+		else:
+			self.resetidle()
+
+	def close(self):
+		self.closing = True
+		self.transport.close()
+
+	# Answer buffered requests in order until one must wait for sendfile
+	def process(self):
+		while not self.busy and not self.closing:
+			end = self.buffer.find(b"\r\n\r\n", 0, MAX_HEADER + 4)
+			if end < 0:
+				if len(self.buffer) > MAX_HEADER:
+					self.send_error(431, "Request header too large\r\n", False)
+				break
+			header_data = bytes(self.buffer[:end])
+			del self.buffer[:end+4]
+			self.found_header(header_data)
+		if not self.busy and not self.closing and len(self.buffer) <= MAX_PIPELINE:
+			self.transport.resume_reading()
+
+	# Got a complete header (up to blank line)
+	def found_header(self,header_data):
 		# Decode header data (binary) into text for further processing
-		header_text = header_data.decode('latin-1')
-		header_lines = header_text.splitlines()
+		header_lines = header_data.decode('latin-1').split("\r\n")
 		request = header_lines[0].split()
-		op = request[0]
-		url = request[1][1:]
-		self.process_request(op,url)
-	
-	# Push text onto outgoing stream, but encode it first
-	def push_text(self,text):
-		self.push(text.encode('latin-1'))
-	
+		if len(request) != 3 or not request[2].startswith("HTTP/"):
+			self.send_error(400, "Malformed request line\r\n", False)
+			return
+		op, url, version = request
+		headers = {}
+		for line in header_lines[1:]:
+			name, sep, value = line.partition(":")
+			if not sep:
+				self.send_error(400, "Malformed header\r\n", False)
+				return
+			headers[name.strip().lower()] = value.strip()
+
+		connection = headers.get("connection", "").lower()
+		if version == "HTTP/1.1":
+			keepalive = connection != "close"
+		else:
+			keepalive = connection == "keep-alive"
+		if headers.get("content-length", "0") != "0" or "transfer-encoding" in headers:
+			# Request bodies are not read, so connection cannot be reused
+			self.send_error(501, "%s with body not implemented\r\n" % op, False)
+			return
+		self.process_request(op, url, version, headers, keepalive)
+
 	# Process request
-	def process_request(self, op, url):
-		if op == "GET":
-			if not os.path.exits(url):
-				self.send_error(404,"File %s not found\r\n")
-			else:
-				type, encoding = mimetypes.guess_type(url)
-				size = os.path.getsize(url)
-				self.push_text("HTTP/1.0 200 OK\r\n")
-				self.push_text("Content-length: %s\r\n" % size)
-				self.push_text("Content-type: %s\r\n" % type)
-				self.push_text("\r\n")
-				self.push_with_producer(file_producer(url))
+	def process_request(self,op,url,version,headers,keepalive):
+		if op not in ("GET", "HEAD"):
+			self.send_error(501, "%s method not implemented\r\n" % op, keepalive)
+			return
+		if url.startswith(API_PREFIX):
+			self.process_api(op, url, version, headers, keepalive)
+			return
+		path = self.translate_path(url)
+		if path is None or not os.path.isfile(path):
+			self.send_error(404, "File %s not found\r\n" % url, keepalive)
+			return
+		try:
+			f = open(path, "rb")
+		except IOError:
+			self.send_error(403, "File %s not readable\r\n" % url, keepalive)
+			return
+		stat = os.fstat(f.fileno())
+		type, encoding = mimetypes.guess_type(path)
+		self.send_header(200, stat.st_size, type or "application/octet-stream", keepalive,
+			[("Last-Modified", formatdate(stat.st_mtime, usegmt=True))])
+		if op == "HEAD" or stat.st_size == 0:
+			f.close()
+			self.finished(keepalive)
+			return
+
+		# Header was written first; sendfile waits for it to drain
+		self.busy = True
+		sending = asyncio.ensure_future(self.loop.sendfile(self.transport, f, 0, stat.st_size))
+		sending.add_done_callback(lambda sending: self.file_sent(sending, f, keepalive))
+
+	def file_sent(self,sending,f,keepalive):
+		f.close()
+		self.busy = False
+		if self.closing:
+			return
+		if sending.cancelled() or sending.exception() is not None:
+			self.close()
+			return
+		self.finished(keepalive)
+		self.process()		# requests pipelined behind file
+
+	# Response complete; close, or keep connection for next request
+	def finished(self,keepalive):
+		if not keepalive:
+			self.close()
 		else:
-			self.send_error(501,"%s method not implemented" % op)
-		self.close_when_done();
-	
+			self.resetidle()
+
+	# Sample data request; see module docstring
+	def process_api(self,op,url,version,headers,keepalive):
+		path, sep, query = url.partition("?")
+		prefix, sep, kind = unquote(path[len(API_PREFIX):]).partition("/")
+		if not prefix.isalnum():
+			self.send_error(404, "No store %s\r\n" % prefix, keepalive)
+			return
+		try:
+			export = SampleExport.Export(STORE_DIRECTORY, prefix, kind, dict(parse_qsl(query)))
+		except LookupError as e:
+			self.send_error(404, "%s\r\n" % e, keepalive)
+			return
+		except ValueError as e:
+			self.send_error(400, "%s\r\n" % e, keepalive)
+			return
+
+		validators = [("ETag", export.etag), ("Last-Modified", formatdate(export.lastModified, usegmt=True)),
+			("Cache-Control", "no-cache")]
+		if self.not_modified(headers, export.etag, export.lastModified):
+			self.send_header(304, None, None, keepalive, validators)
+			self.finished(keepalive)
+			return
+
+		# HTTP/1.0 has no chunked encoding; body then ends when connection closes
+		chunked = (version == "HTTP/1.1")
+		if chunked:
+			validators.append(("Transfer-Encoding", "chunked"))
+		else:
+			keepalive = False
+		self.send_header(200, None, export.contentType, keepalive, validators)
+		if op == "HEAD":
+			self.finished(keepalive)
+			return
+		self.busy = True
+		self.streaming = (export.chunks(), chunked, keepalive)
+		self.stream()
+
+	# True if request's validators match; If-None-Match takes precedence
+	def not_modified(self,headers,etag,lastModified):
+		if "if-none-match" in headers:
+			tags = [tag.strip() for tag in headers["if-none-match"].split(",")]
+			return etag in tags or "*" in tags
+		if "if-modified-since" in headers:
+			try:
+				since = parsedate_to_datetime(headers["if-modified-since"]).timestamp()
+			except (TypeError, ValueError):
+				return False
+			return int(lastModified) <= since
+		return False
+
+	# Write chunks until transport's buffer fills, STREAM_BATCH at a time
+	def stream(self):
+		if self.streaming is None:
+			return		# connection lost since this call was scheduled
+		chunks, chunked, keepalive = self.streaming
+		for i in range(STREAM_BATCH):
+			if self.paused or self.closing:
+				return
+			try:
+				chunk = next(chunks, None)
+			except Exception:
+				# Header is gone; closing without final chunk tells client body is incomplete
+				traceback.print_exc()
+				self.streaming = None
+				self.close()
+				return
+			if chunk is None:
+				if chunked:
+					self.transport.write(b"0\r\n\r\n")
+				self.streaming = None
+				self.busy = False
+				self.finished(keepalive)
+				self.process()		# requests pipelined behind stream
+				return
+			if chunked:
+				self.transport.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+			else:
+				self.transport.write(chunk)
+		self.loop.call_soon(self.stream)
+
+	# Map URL to file under current directory; None if it would leave it
+	def translate_path(self,url):
+		path = unquote(url.split("?", 1)[0].split("#", 1)[0])
+		path = posixpath.normpath(path)
+		parts = [part for part in path.split("/") if part]
+		if not parts or ".." in parts:
+			return None
+		return os.path.join(os.getcwd(), *parts)
+
+	# Write status line and headers, encoded
+	#  (no Content-Length or Content-Type if None)
+	def send_header(self,code,length,type,keepalive,extra=()):
+		lines = ["HTTP/1.1 %s %s" % (code, responses[code]),
+			"Date: %s" % formatdate(time.time(), usegmt=True)]
+		if length is not None:
+			lines.append("Content-Length: %d" % length)
+		if type is not None:
+			lines.append("Content-Type: %s" % type)
+		lines.append("Connection: %s" % ("keep-alive" if keepalive else "close"))
+		lines.extend(["%s: %s" % header for header in extra])
+		self.transport.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
 	# Error handling
-	def send_error(self,code,message):
-		self.push_text("HTTP/1.0 %s %s\r\n" % (code, responses[code]))
-		self.push_text("Content-type: text/plain\r\n")
-		self.push_text("\r\n")
-		self.push_text(message)
-
-class file_producer(object):
-	def __init__(self,filename,buffer_size=512):
-		self.f = open(filename,"rb")
-		self.buffer_size = buffer_size
-	def more(self):
-		data = self.f.read(self.buffer_size)
-		if not_data:
-			self.f.clos()
-		return data
-
-a = async_http(8888)
-asyncore.loop()
+	def send_error(self,code,message,keepalive):
+		body = message.encode('latin-1')
+		self.send_header(code, len(body), "text/plain", keepalive)
+		self.transport.write(body)
+		self.finished(keepalive)
+
+# Start server on loop; returns asyncio Server
+def async_http(port,loop):
+	return loop.run_until_complete(loop.create_server(async_http_handler, port=port, reuse_address=True))
 
+if __name__ == '__main__':
+	loop = asyncio.new_event_loop()
+	asyncio.set_event_loop(loop)
+	server = async_http(PORT, loop)
+	loop.run_forever()